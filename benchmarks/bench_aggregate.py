@@ -0,0 +1,43 @@
+"""compare ungrouped aggregation through a constant groupby key, the way
+PandasCursor used to compute SELECT SUM(...) without GROUP BY, against the
+direct column reductions it uses now
+
+    PYTHONPATH=. python benchmarks/bench_aggregate.py [rows] [repeat]
+"""
+import sys
+from timeit import Timer
+
+import numpy as np
+import pandas as pd
+
+from sql4pandas.aggregate import reduce_columns
+
+FUNS = {'tbl1.a': ['sum', 'max'], 'tbl1.b': ['min'], 'tbl1.c': ['mean'],
+        'tbl1.d': ['count']}
+
+
+def fake_column(frame, funs):
+    frame['####fake'] = 0
+    try:
+        return frame.groupby('####fake').agg(funs).reset_index()
+    finally:
+        del frame['####fake']
+
+
+def main(rows=1000000, repeat=10):
+    frame = pd.DataFrame(np.random.randn(rows, 5),
+                         columns=['tbl1.' + c for c in 'abcde'])
+    expected = fake_column(frame, FUNS)
+    result = reduce_columns(frame, FUNS)
+    for col, fns in FUNS.iteritems():
+        for fn in fns:
+            assert np.allclose(expected[col][fn].values, result[col][fn].values)
+
+    print 'rows: %d' % rows
+    for name, fn in ('fake column groupby', fake_column), \
+            ('direct reduction', reduce_columns):
+        best = min(Timer(lambda: fn(frame, FUNS)).repeat(repeat, 1))
+        print '%-20s %10.3f ms' % (name, best * 1000)
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,214 @@
+"""benchmark suite for the executor, timing each kind of statement over
+generated tables across a grid of row counts, column counts, key
+cardinalities and join selectivities. results are written as JSON lines,
+one per benchmark and point of the grid, and can be compared against those
+of an earlier run to catch regressions
+
+    PYTHONPATH=. python benchmarks/bench_executor.py \\
+        [--rows 1000,100000,1000000] [--columns 4] [--cardinality 100,10000] \\
+        [--selectivity 0.1,1.0] [--parser sqlparse,antlr] [--repeat 5] \\
+        [--only filter,join_inner] [--output results.jsonl] \\
+        [--compare baseline.jsonl] [--tolerance 0.25]
+
+rows up to 50000000 take several GB of memory. exits with status 1 when a
+benchmark is slower than in the baseline by more than the tolerance
+"""
+import argparse
+import json
+import platform
+import sys
+from timeit import Timer
+
+import numpy as np
+import pandas as pd
+
+from sql4pandas import Connection
+
+# name, statement and the parameters of the grid the benchmark varies with,
+# the others being held at their first value. tbl1 has rows rows of
+# columns c0, c1... and a key k, tbl2 one row per key of which selectivity
+# match a key of tbl1
+BENCHMARKS = [
+    ('parse', """SELECT tbl1.c0, tbl1.c1 * 2 AS d, SUM(tbl2.v) AS s
+                 FROM tbl1 INNER JOIN tbl2 ON tbl1.k = tbl2.k
+                 WHERE tbl1.c0 > 0 AND tbl2.v < 10
+                 GROUP BY tbl1.c0, tbl1.c1""", ()),
+    ('scan', """SELECT tbl1.k, tbl1.c0 FROM tbl1""", ('rows', 'columns')),
+    ('filter', """SELECT tbl1.k, tbl1.c0 FROM tbl1
+                  WHERE tbl1.c0 > 0.5 AND tbl1.c1 < 0""",
+     ('rows', 'columns')),
+    ('ops', """SELECT (tbl1.c0 + tbl1.c1) * 2 AS a, tbl1.c0 / tbl1.c1 AS b
+               FROM tbl1""", ('rows', 'columns')),
+    ('case', """SELECT CASE WHEN tbl1.c0 > 0 THEN tbl1.c1
+                            WHEN tbl1.c1 > 0 THEN tbl1.c0
+                            ELSE 0 END AS c
+                FROM tbl1""", ('rows', 'columns')),
+    ('aggregate', """SELECT SUM(tbl1.c0), MAX(tbl1.c1), COUNT(tbl1.k)
+                     FROM tbl1""", ('rows', 'columns')),
+    ('group_by', """SELECT tbl1.k, tbl1.g, SUM(tbl1.c0), MEAN(tbl1.c1)
+                    FROM tbl1 GROUP BY tbl1.k, tbl1.g""",
+     ('rows', 'cardinality')),
+    ('order_by', """SELECT tbl1.k, tbl1.c0 FROM tbl1
+                    ORDER BY tbl1.k, tbl1.c0""", ('rows', 'cardinality')),
+    ('join_inner', """SELECT tbl1.c0, tbl2.v FROM tbl1
+                      INNER JOIN tbl2 ON tbl1.k = tbl2.k""",
+     ('rows', 'cardinality', 'selectivity')),
+    ('join_left', """SELECT tbl1.c0, tbl2.v FROM tbl1
+                     LEFT JOIN tbl2 ON tbl1.k = tbl2.k""",
+     ('rows', 'cardinality', 'selectivity')),
+    ('join_right', """SELECT tbl1.c0, tbl2.v FROM tbl1
+                      RIGHT JOIN tbl2 ON tbl1.k = tbl2.k""",
+     ('rows', 'cardinality', 'selectivity')),
+    ('join_outer', """SELECT tbl1.c0, tbl2.v FROM tbl1
+                      FULL OUTER JOIN tbl2 ON tbl1.k = tbl2.k""",
+     ('rows', 'cardinality', 'selectivity')),
+    ('nested', """SELECT s.c0, t.v
+                  FROM (SELECT tbl1.k, tbl1.c0 FROM tbl1
+                        WHERE tbl1.c0 > 0) s
+                      INNER JOIN
+                      (SELECT tbl2.k, tbl2.v FROM tbl2
+                       WHERE tbl2.v > 1) t
+                      ON s.k = t.k""", ('rows', 'cardinality', 'selectivity')),
+]
+
+GRID = ('rows', 'columns', 'cardinality', 'selectivity')
+
+
+def tables(rows, columns, cardinality, selectivity, seed=0):
+    """tbl1 of rows rows with columns random float columns, a key k taking
+    cardinality values and a second key g of 10 values, and tbl2 with a
+    row for each of cardinality keys, selectivity of which are keys of
+    tbl1"""
+    random = np.random.RandomState(seed)
+    tbl1 = pd.DataFrame(random.randn(rows, columns),
+                        columns=['c%d' % i for i in xrange(columns)])
+    tbl1['k'] = random.randint(0, cardinality, rows)
+    tbl1['g'] = random.randint(0, 10, rows)
+    offset = int(round(cardinality * (1 - selectivity)))
+    tbl2 = pd.DataFrame({'k': np.arange(cardinality) + offset,
+                         'v': random.rand(cardinality) * 20})
+    return {'tbl1': tbl1, 'tbl2': tbl2}
+
+
+def points(args, uses):
+    """the points of the grid a benchmark varies with"""
+    grid = [[]]
+    for name in GRID:
+        values = getattr(args, name)
+        if name not in uses:
+            values = values[:1]
+        grid = [point + [value] for point in grid for value in values]
+    return [dict(zip(GRID, point)) for point in grid]
+
+
+def run(name, statement, point, parser, db, repeat):
+    """time a benchmark at a point of the grid, a record of the result"""
+    record = dict(point, benchmark=name, parser=parser)
+    if name == 'parse':
+        # a cache of 0 parses the statement every time
+        connection = Connection(db, cache_size=0, parser=parser)
+        fn = lambda: connection.plan(statement)
+    else:
+        crs = Connection(db, parser=parser).cursor()
+        fn = lambda: crs.execute(statement)
+    try:
+        # the first run parses the statement and builds the parser's DFA
+        fn()
+        times = sorted(Timer(fn).repeat(repeat, 1))
+    except Exception as e:
+        record['error'] = '%s: %s' % (type(e).__name__, e)
+        return record
+    record['seconds'] = times[0]
+    record['median_seconds'] = times[len(times) // 2]
+    if name != 'parse':
+        record['result_rows'] = len(crs.fetchall())
+        record['stages'] = dict(
+            (stage, totals['seconds'])
+            for stage, totals in crs.last_stats.stages.iteritems())
+    return record
+
+
+def key(record):
+    return tuple(record.get(name) for name in
+                 ('benchmark', 'parser') + GRID)
+
+
+def compare(records, baseline, tolerance):
+    """records slower than the record of the same benchmark and point in
+    baseline by more than tolerance, as (record, baseline seconds)"""
+    before = dict((key(record), record) for record in baseline
+                  if 'seconds' in record)
+    slower = []
+    for record in records:
+        old = before.get(key(record))
+        if old is not None and 'seconds' in record and \
+                record['seconds'] > old['seconds'] * (1 + tolerance):
+            slower.append((record, old['seconds']))
+    return slower
+
+
+def listed(cast):
+    return lambda value: [cast(x) for x in value.split(',')]
+
+
+def main(argv):
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    arguments.add_argument('--rows', type=listed(int),
+                           default=[1000, 100000, 1000000])
+    arguments.add_argument('--columns', type=listed(int), default=[4])
+    arguments.add_argument('--cardinality', type=listed(int),
+                           default=[100, 10000])
+    arguments.add_argument('--selectivity', type=listed(float),
+                           default=[0.1, 1.0])
+    arguments.add_argument('--parser', type=listed(str),
+                           default=['sqlparse', 'antlr'])
+    arguments.add_argument('--repeat', type=int, default=5)
+    arguments.add_argument('--only', type=listed(str), default=None)
+    arguments.add_argument('--output', default=None)
+    arguments.add_argument('--compare', default=None)
+    arguments.add_argument('--tolerance', type=float, default=0.25)
+    args = arguments.parse_args(argv)
+
+    benchmarks = [b for b in BENCHMARKS
+                  if args.only is None or b[0] in args.only]
+    # every benchmark at a point shares the tables generated for it
+    runs = {}
+    for name, statement, uses in benchmarks:
+        for point in points(args, uses):
+            runs.setdefault(tuple(point[x] for x in GRID), []).append(
+                (name, statement, uses))
+
+    environment = {'python': platform.python_version(),
+                   'pandas': pd.__version__, 'numpy': np.__version__}
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    records = []
+    try:
+        for point in sorted(runs):
+            db = tables(*point)
+            point = dict(zip(GRID, point))
+            for name, statement, uses in runs[tuple(point[x] for x in GRID)]:
+                for parser in args.parser:
+                    record = run(name, statement, point, parser, db,
+                                 args.repeat)
+                    record.update(environment)
+                    records.append(record)
+                    output.write(json.dumps(record, sort_keys=True) + '\n')
+                    output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = [json.loads(line) for line in f if line.strip()]
+        slower = compare(records, baseline, args.tolerance)
+        for record, seconds in slower:
+            sys.stderr.write('%s %s %s: %.3f ms, was %.3f ms\n' % (
+                record['benchmark'], record['parser'],
+                ' '.join('%s=%s' % (x, record[x]) for x in GRID),
+                record['seconds'] * 1000, seconds * 1000))
+        return 1 if len(slower) > 0 else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,57 @@
+"""time importing sql4pandas and the first statement parsed by the ANTLR
+front end in fresh processes, with the grammar's DFA cache disabled and
+with it loaded from a cache file written by an earlier process
+
+    PYTHONPATH=. python benchmarks/bench_import.py [repeat]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+IMPORT = """
+import sys, time
+start = time.time()
+import sql4pandas
+print (time.time() - start) * 1000, int('sql4pandas.SQLiteParser' in sys.modules)
+"""
+
+FIRST_PARSE = """
+import sys, time
+sys.path.insert(0, 'benchmarks')
+from bench_parse import CORPUS
+from sql4pandas.antlrparser import ANTLRParser
+start = time.time()
+ANTLRParser().parse_statement(CORPUS[int(sys.argv[1])])
+print (time.time() - start) * 1000
+"""
+
+
+def run(script, env, *args):
+    out = subprocess.check_output([sys.executable, '-c', script] +
+                                  list(args), env=env)
+    return [float(x) for x in out.split()]
+
+
+def main(repeat=5):
+    env = dict(os.environ)
+    tmp = tempfile.mkdtemp()
+    try:
+        imports = [run(IMPORT, env) for i in xrange(repeat)]
+        print 'import sql4pandas %10.3f ms, grammar loaded: %s' % (
+            min(x[0] for x in imports), bool(imports[0][1]))
+
+        env['SQL4PANDAS_DFA_CACHE'] = ''
+        cold = min(run(FIRST_PARSE, env, '3')[0] for i in xrange(repeat))
+        env['SQL4PANDAS_DFA_CACHE'] = os.path.join(tmp, 'SQLite.dfa')
+        # the first process writes the cache file on exit
+        run(FIRST_PARSE, env, '3')
+        cached = min(run(FIRST_PARSE, env, '3')[0] for i in xrange(repeat))
+        print 'first parse, no DFA cache %10.3f ms' % cold
+        print 'first parse, DFA cache    %10.3f ms' % cached
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
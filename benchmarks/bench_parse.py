@@ -0,0 +1,64 @@
+"""compare the time taken to parse statements into an execution plan by the
+sqlparse front end and the ANTLR SQLite grammar front end, over a corpus of
+statements like the ones in sql4pandas/tests.py
+
+    PYTHONPATH=. python benchmarks/bench_parse.py [repeat]
+"""
+import sys
+from timeit import Timer
+
+from sql4pandas.sqlparser import SQLParser
+from sql4pandas.antlrparser import ANTLRParser
+
+CORPUS = [
+    """SELECT 5 as five, 'test' as test, 5 + 5 as ten, tbl1.e as e
+       FROM tbl1""",
+    """SELECT SUM(tbl1.a), SUM(tbl1.b), SUM(tbl1.a) + SUM(tbl1.b) FROM tbl1""",
+    """SELECT tbl1.e, tbl1.b, tbl1.a, ((tbl1.e + tbl1.b) / tbl1.a) * 10 as eb,
+              (tbl1.e + tbl1.b) / tbl1.a as ba
+       FROM tbl1""",
+    """SELECT tbl2.a, tbl1.b FROM tbl2 LEFT JOIN tbl1 ON tbl2.e = tbl1.e
+       WHERE tbl1.a > 0 AND tbl2.b < 0""",
+    """SELECT SUM(tbl1.e) FROM tbl2 LEFT JOIN tbl1 ON tbl2.e = tbl1.e
+       WHERE tbl1.a > 0 AND tbl2.b < 0 GROUP BY tbl1.a, tbl2.b""",
+    """SELECT tbl2.e as test FROM tbl1 INNER JOIN tbl2 ON tbl2.a = tbl1.a
+       WHERE tbl2.a > 7""",
+    """SELECT CASE WHEN SUM(tbl1.e) > 0 THEN SUM(tbl1.e)
+                   ELSE SUM(tbl2.a) END AS rand,
+              MIN(tbl1.b) as min,
+              CASE WHEN MIN(tbl1.c) < 0 THEN MIN(tbl1.c)
+                   WHEN MAX(tbl2.b) > 0 THEN MAX(tbl1.e)
+                   ELSE SUM(tbl1.b) END as crazy
+       FROM tbl2 LEFT JOIN tbl1 ON tbl2.e = tbl1.e
+       WHERE tbl1.a > 0 AND tbl2.b < 0
+       GROUP BY tbl1.a, tbl2.b
+       ORDER BY SUM(tbl1.d)""",
+    """SELECT t.a, t.b FROM (SELECT tbl1.a, tbl1.b FROM tbl1
+                            WHERE tbl1.a > 0) t
+       WHERE t.b < 0""",
+]
+
+
+def main(repeat=5):
+    parsers = [('sqlparse', SQLParser()), ('antlr', ANTLRParser())]
+    # the first parse of the ANTLR front end also fills its prediction
+    # cache, time it separately from the statements parsed after it
+    for name, parser in parsers:
+        best = min(Timer(lambda: parser.parse_statement(CORPUS[0]))
+                   .repeat(1, 1))
+        print '%-10s first statement %10.3f ms' % (name, best * 1000)
+    print
+    print '%-10s %10s %10s' % ('statement', 'sqlparse', 'antlr')
+    totals = [0, 0]
+    for i, statement in enumerate(CORPUS):
+        times = []
+        for name, parser in parsers:
+            timer = Timer(lambda: parser.parse_statement(statement))
+            times.append(min(timer.repeat(repeat, 1)))
+        totals = [x + y for x, y in zip(totals, times)]
+        print '%-10d %7.3f ms %7.3f ms' % (i, times[0] * 1000, times[1] * 1000)
+    print '%-10s %7.3f ms %7.3f ms' % ('total', totals[0] * 1000,
+                                       totals[1] * 1000)
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,292 @@
+"""differential check of sql4pandas against the sqlite3 in-memory database.
+the same tables are loaded into both, a corpus of SELECT, JOIN, GROUP BY and
+CASE statements generated from a few shapes is run through each, and the
+rows each returns compared, along with the ratio of their times for every
+statement. every statement is run by a plain cursor and again in chunks, over
+partitions in worker processes and through executemany with its literal n
+bound as a parameter. results are written as JSON lines followed by a summary
+by shape, parser and mode
+
+    PYTHONPATH=. python benchmarks/bench_sqlite.py \\
+        [--rows 10000] [--statements 5] [--parser sqlparse,antlr] \\
+        [--mode default,chunked,processes,executemany] \\
+        [--repeat 3] [--seed 0] [--output results.jsonl]
+
+exits with status 1 when the rows of any statement differ
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from timeit import Timer
+
+import numpy as np
+import pandas as pd
+
+from sql4pandas import Connection, parallel
+
+# the statements of each shape are generated by filling in the template
+# with random choices of the values given for each name in it
+COLUMNS = ['tbl1.a', 'tbl1.b', 'tbl1.c']
+SHAPES = [
+    ('filter', """SELECT tbl1.g, {x} FROM tbl1 WHERE {x} {op} {n}
+                  AND tbl1.k {op2} {m}""",
+     {'x': COLUMNS, 'op': ['<', '>', '<=', '>='], 'op2': ['=', '!=', '>'],
+      'n': [-50, 0, 25], 'm': [1, 3, 7]}),
+    ('boolean', """SELECT tbl1.g, {x} FROM tbl1
+                   WHERE ({x} > {n} OR {y} < {m}) AND tbl1.k {op} 4""",
+     {'x': COLUMNS, 'y': COLUMNS, 'op': ['=', '!=', '>'],
+      'n': [-50, 0, 25], 'm': [-25, 0, 50]}),
+    ('boolean_nested', """SELECT tbl1.k, {x} FROM tbl1
+                          WHERE {x} > {n} AND (tbl1.k < 3 OR {y} > {m}
+                                                AND tbl1.g != 5)""",
+     {'x': COLUMNS, 'y': COLUMNS, 'n': [-50, 0, 25], 'm': [-25, 0, 50]}),
+    ('arithmetic', """SELECT {x} + {y} AS s, ({x} - {y}) * {n} AS d
+                      FROM tbl1 WHERE {y} > {m}""",
+     {'x': COLUMNS, 'y': COLUMNS, 'n': [2, 3, 10], 'm': [-20, 0, 20]}),
+    ('case', """SELECT tbl1.k, CASE WHEN {x} > {n} THEN {y}
+                                    WHEN {y} > {n} THEN {x}
+                                    ELSE {m} END AS c
+                FROM tbl1""",
+     {'x': COLUMNS, 'y': COLUMNS, 'n': [-10, 0, 10], 'm': [0, 1, -1]}),
+    ('aggregate', """SELECT SUM({x}), MIN({y}), MAX({x}), COUNT({y})
+                     FROM tbl1 WHERE {y} > {n}""",
+     {'x': COLUMNS, 'y': COLUMNS, 'n': [-50, 0, 50]}),
+    ('group_by', """SELECT tbl1.g, tbl1.k, SUM({x}), MAX({y}), COUNT({x})
+                    FROM tbl1 WHERE {x} > {n} GROUP BY tbl1.g, tbl1.k""",
+     {'x': COLUMNS, 'y': COLUMNS, 'n': [-50, 0, 50]}),
+    # a column both grouped on and aggregated
+    ('group_by_key', """SELECT tbl1.k, tbl1.g, SUM(tbl1.g), MAX({x})
+                        FROM tbl1 WHERE {x} > {n} GROUP BY tbl1.k, tbl1.g""",
+     {'x': COLUMNS, 'n': [-50, 0, 50]}),
+    # ordered on every column selected, so ties can't be returned in
+    # different orders
+    ('order_by', """SELECT tbl1.g, {x} FROM tbl1 WHERE {x} > {n}
+                    ORDER BY {x}, tbl1.g""",
+     {'x': COLUMNS, 'n': [-50, 0, 50]}),
+    ('join', """SELECT {x}, tbl3.h FROM tbl1 {how} JOIN tbl3
+                ON tbl1.g = tbl3.g WHERE {x} > {n}""",
+     {'x': COLUMNS, 'how': ['INNER', 'LEFT'], 'n': [-50, 0, 50]}),
+    ('join_filter', """SELECT {x}, tbl3.h FROM tbl1 {how} JOIN tbl3
+                       ON tbl1.g = tbl3.g WHERE tbl3.h > {n} AND {x} < {m}""",
+     {'x': COLUMNS, 'how': ['INNER', 'LEFT'], 'n': [-1, 0, 1],
+      'm': [-25, 0, 25]}),
+    ('join_group', """SELECT tbl1.k, tbl3.g, SUM({x}), COUNT(tbl3.h)
+                      FROM tbl1 INNER JOIN tbl3 ON tbl1.g = tbl3.g
+                      GROUP BY tbl1.k, tbl3.g""",
+     {'x': COLUMNS}),
+    ('join_case', """SELECT CASE WHEN {x} > {n} THEN {x} ELSE tbl2.b END AS c,
+                            tbl2.k
+                     FROM tbl1 INNER JOIN tbl2 ON tbl1.a = tbl2.a
+                     WHERE tbl2.k = {m}""",
+     {'x': COLUMNS, 'n': [-10, 0, 10], 'm': [0, 2, 5]}),
+    ('join_boolean', """SELECT {x}, tbl3.h FROM tbl1 {how} JOIN tbl3
+                        ON tbl1.g = tbl3.g
+                        WHERE ({x} > {n} OR tbl3.h < 0) AND
+                              ({y} < {m} OR tbl1.k = 2)""",
+     {'x': COLUMNS, 'y': COLUMNS, 'how': ['INNER', 'LEFT'],
+      'n': [-50, 0, 50], 'm': [-25, 0, 25]}),
+    ('join_chain', """SELECT {x}, tbl2.k, tbl3.h FROM tbl1
+                       INNER JOIN tbl2 ON tbl1.a = tbl2.a
+                       {how} JOIN tbl3 ON tbl1.g = tbl3.g
+                       INNER JOIN tbl3 t ON tbl2.g = t.g WHERE {x} > {n}""",
+     {'x': COLUMNS, 'how': ['INNER', 'LEFT'], 'n': [-50, 0, 50]}),
+    ('nested', """SELECT s.{c}, t.h
+                  FROM (SELECT tbl1.{c}, tbl1.g FROM tbl1
+                        WHERE tbl1.{c} > {n}) s
+                      {how} JOIN
+                      (SELECT tbl3.g, tbl3.h FROM tbl3 WHERE tbl3.h > {m}) t
+                      ON s.g = t.g""",
+     {'c': ['a', 'b', 'c'], 'how': ['INNER', 'LEFT'], 'n': [-50, 0, 50],
+      'm': [-1, 0]}),
+]
+
+
+# keyword arguments of the cursor each mode runs statements with,
+# executemany running them with a cursor of the default mode
+MODES = [('default', {}), ('chunked', {'chunksize': 1000}),
+         ('processes', {'processes': 2}), ('executemany', {})]
+
+
+def tables(rows, seed=0):
+    """tbl1 of rows rows with float columns a, b, c rounded to a tenth and
+    integer keys g of 20 values and k of 10, tbl2 a copy of tbl1 and tbl3
+    a row for every other key g"""
+    random = np.random.RandomState(seed)
+    tbl1 = pd.DataFrame(np.round(random.randn(rows, 3) * 50, 1),
+                        columns=['a', 'b', 'c'])
+    tbl1['g'] = random.randint(0, 20, rows)
+    tbl1['k'] = random.randint(0, 10, rows)
+    tbl3 = pd.DataFrame({'g': np.arange(0, 20, 2),
+                         'h': np.round(random.randn(10), 2)})
+    return {'tbl1': tbl1, 'tbl2': tbl1.copy(), 'tbl3': tbl3}
+
+
+def render(template, values):
+    return ' '.join(template.format(**values).split())
+
+
+def corpus(count, seed=0):
+    """(shape, template, values) of the statements, count of each shape,
+    values being the choice made for each name of the template"""
+    random = np.random.RandomState(seed)
+    statements = []
+    for shape, template, choices in SHAPES:
+        for i in xrange(count):
+            values = dict((name, values[random.randint(len(values))])
+                          for name, values in choices.iteritems())
+            statements.append((shape, template, values))
+    return statements
+
+
+def canonical(rows, ordered):
+    """rows as a frame of floats where they are numbers, nulls as nan, in
+    their own order when ordered and sorted otherwise"""
+    frame = pd.DataFrame([list(row) for row in rows])
+    for col in frame.columns:
+        try:
+            frame[col] = frame[col].astype(float)
+        except (TypeError, ValueError):
+            pass
+    if not ordered and len(frame.columns) > 0:
+        frame = frame.sort_values(list(frame.columns))
+    return frame.reset_index(drop=True)
+
+
+def same(left, right):
+    """whether two canonical frames hold the same rows"""
+    if left.shape != right.shape:
+        return False
+    for col in left.columns:
+        a, b = left[col].values, right[col].values
+        if a.dtype.kind == 'f' and b.dtype.kind == 'f':
+            if not np.allclose(a, b, rtol=1e-9, atol=1e-9, equal_nan=True):
+                return False
+        elif list(a) != list(b):
+            return False
+    return True
+
+
+def best(fn, repeat):
+    return min(Timer(fn).repeat(repeat, 1))
+
+
+def check(shape, template, values, parser, mode, db, lite, repeat):
+    """run a statement through both engines, a record of how they compare.
+    under executemany the statement is run once for every choice of n, n
+    being bound as a parameter, and compared with sqlite running each"""
+    statement = render(template, values)
+    record = {'shape': shape, 'statement': statement, 'parser': parser,
+              'mode': mode}
+    ordered = ' ORDER BY ' in statement
+    statements, sets = [statement], None
+    if mode == 'executemany':
+        choices = dict((s, c) for s, t, c in SHAPES)[shape]
+        statement = render(template, dict(values, n='?'))
+        statements = [render(template, dict(values, n=n))
+                      for n in choices['n']]
+        sets = [(n,) * template.count('{n}') for n in choices['n']]
+        record['statement'] = statement
+    expected = [lite.execute(s).fetchall() for s in statements]
+    record['rows'] = sum(len(rows) for rows in expected)
+    record['sqlite_seconds'] = best(
+        lambda: [lite.execute(s).fetchall() for s in statements], repeat)
+    crs = Connection(db, parser=parser).cursor(**dict(MODES)[mode])
+
+    def run():
+        if sets is None:
+            crs.execute(statement)
+        else:
+            crs.executemany(statement, sets)
+        return crs.fetchall()
+    try:
+        result = run()
+        record['seconds'] = best(run, repeat)
+    except Exception as e:
+        record['error'] = '%s: %s' % (type(e).__name__, e)
+        return record
+    if sets is None:
+        results = [result.values]
+    else:
+        # the result of each set is keyed on its position
+        position = result.index.get_level_values(0)
+        results = [result.values[position == i] for i in xrange(len(sets))]
+    record['ratio'] = record['seconds'] / record['sqlite_seconds']
+    record['match'] = all(same(canonical(got, ordered),
+                               canonical(rows, ordered))
+                          for got, rows in zip(results, expected))
+    return record
+
+
+def summary(records):
+    """lines summing up the records of each shape, parser and mode, the
+    ratio being the geometric mean of sql4pandas time over sqlite time"""
+    groups = {}
+    for record in records:
+        groups.setdefault((record['shape'], record['parser'],
+                           record['mode']), []).append(record)
+    lines = ['%-14s %-9s %-12s %5s %9s %7s %12s' % (
+        'shape', 'parser', 'mode', 'run', 'mismatch', 'error', 'time ratio')]
+    for shape, template, choices in SHAPES:
+        for key in sorted(k for k in groups if k[0] == shape):
+            group = groups[key]
+            ratios = [r['ratio'] for r in group if 'ratio' in r]
+            lines.append('%-14s %-9s %-12s %5d %9d %7d %12s' % (
+                shape, key[1], key[2], len(group),
+                sum(not r.get('match', True) for r in group),
+                sum('error' in r for r in group),
+                '%.2fx' % np.exp(np.mean(np.log(ratios)))
+                if len(ratios) > 0 else '-'))
+    return lines
+
+
+def listed(value):
+    return value.split(',')
+
+
+def main(argv):
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    arguments.add_argument('--rows', type=int, default=10000)
+    arguments.add_argument('--statements', type=int, default=5)
+    arguments.add_argument('--parser', type=listed,
+                           default=['sqlparse', 'antlr'])
+    arguments.add_argument('--mode', type=listed,
+                           default=[mode for mode, kwargs in MODES])
+    arguments.add_argument('--repeat', type=int, default=3)
+    arguments.add_argument('--seed', type=int, default=0)
+    arguments.add_argument('--output', default=None)
+    args = arguments.parse_args(argv)
+
+    db = tables(args.rows, args.seed)
+    # small enough for the tables here to be split between the processes
+    parallel.MIN_PARTITION = max(1, args.rows // 4)
+    lite = sqlite3.connect(':memory:')
+    for name, frame in db.iteritems():
+        frame.to_sql(name, lite, index=False)
+
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    records = []
+    try:
+        for shape, template, values in corpus(args.statements, args.seed):
+            for parser in args.parser:
+                for mode in args.mode:
+                    if mode == 'executemany' and '{n}' not in template:
+                        continue
+                    record = check(shape, template, values, parser, mode,
+                                   db, lite, args.repeat)
+                    records.append(record)
+                    output.write(json.dumps(record, sort_keys=True) + '\n')
+                    output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    for line in summary(records):
+        sys.stderr.write(line + '\n')
+    for record in records:
+        if not record.get('match', True):
+            sys.stderr.write('mismatch (%s, %s): %s\n' % (
+                record['parser'], record['mode'], record['statement']))
+    return 1 if any(not r.get('match', True) for r in records) else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
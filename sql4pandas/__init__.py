@@ -1,2 +1,3 @@
 from sql4pandas import PandasCursor
-__all__ = [PandasCursor]
+from connection import Connection
+__all__ = [PandasCursor, Connection]
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+# aggregate functions that reduce a Series directly through the method of the
+# same name, these are computed straight from the column's values
+REDUCTIONS = frozenset(['sum', 'mean', 'median', 'min', 'max', 'std', 'var',
+                        'count', 'prod', 'nunique', 'sem'])
+
+
+def reduce_column(series, fn):
+    """aggregate an entire column into a single value"""
+    if callable(fn):
+        return fn(series)
+    if fn == 'sum' and series.count() == 0:
+        # SQL sums nothing to NULL, not 0
+        return np.nan
+    if fn in REDUCTIONS:
+        return getattr(series, fn)()
+    # any other groupby aggregate (first, last...) runs over a single group
+    # of just this column
+    key = np.zeros(len(series), dtype=np.int8)
+    result = series.groupby(key).agg(fn)
+    return result.iloc[0] if len(result) > 0 else np.nan
+
+
+def reduce_columns(frame, funs):
+    """aggregate entire columns of frame into a one row frame with the same
+    (column, function) columns groupby(...).agg(funs) would produce. funs is
+    a dictionary of column name to a list of functions"""
+    keys, values = [], []
+    for col, fns in funs.iteritems():
+        series = frame[col]
+        for fn in fns:
+            # name columns after callables the way groupby does
+            keys.append((col, getattr(fn, '__name__', fn)))
+            values.append(reduce_column(series, fn))
+    return pd.DataFrame([values], columns=pd.MultiIndex.from_tuples(keys))
+
+
+# aggregates which can be computed a chunk of rows at a time, mapped to the
+# partial states they are finished from. the states of each chunk are
+# combined with those of the chunks before it, m2 being the sum of squared
+# deviations from the mean. sums keep a count of the values summed, as a sum
+# of no values is NULL
+DECOMPOSABLE = {'sum': ('count', 'sum'), 'count': ('count',),
+                'min': ('min',), 'max': ('max',), 'mean': ('count', 'sum'),
+                'var': ('count', 'sum', 'm2'), 'std': ('count', 'sum', 'm2')}
+
+
+def _partial(frame, key, funs):
+    """partial states of the aggregates of a single chunk, indexed on its
+    groups with a (column, state) column for each state"""
+    grouped = frame.groupby(key)
+    states = {}
+    for col, fns in funs.iteritems():
+        for state in set(s for fn in fns for s in DECOMPOSABLE[fn]):
+            if state == 'm2':
+                # var only has a fast path for the default of ddof=1
+                states[(col, state)] = grouped[col].var().fillna(0) * \
+                    (grouped[col].count() - 1).clip_lower(0)
+            else:
+                states[(col, state)] = getattr(grouped[col], state)()
+    return pd.DataFrame(states)
+
+
+def _combine(a, b):
+    """partial states of two sets of rows combined into those of both"""
+    index = a.index.union(b.index)
+    a, b = a.reindex(index), b.reindex(index)
+    states = {}
+    for col, state in a.columns:
+        x, y = a[(col, state)], b[(col, state)]
+        if state in ('count', 'sum'):
+            states[(col, state)] = x.add(y, fill_value=0)
+        elif state in ('min', 'max'):
+            states[(col, state)] = getattr(pd.concat([x, y], axis=1),
+                                           state)(axis=1)
+        else:
+            # the deviations of each side are taken from its own mean, so
+            # the difference between the means makes up the rest
+            na = a[(col, 'count')].fillna(0)
+            nb = b[(col, 'count')].fillna(0)
+            delta = b[(col, 'sum')] / nb - a[(col, 'sum')] / na
+            states[(col, state)] = x.fillna(0) + y.fillna(0) + \
+                (delta ** 2 * na * nb / (na + nb)).fillna(0)
+    return pd.DataFrame(states)
+
+
+class PartialAggregate(object):
+    """aggregates of columns computed a chunk of rows at a time, holding only
+    the partial states of each group between chunks. funs is a dictionary of
+    column name to a list of the functions in DECOMPOSABLE, group_by the
+    columns grouped on or None to aggregate entire columns. once every chunk
+    is passed to update, result gives the frame groupby(group_by).agg(funs)
+    .reset_index(), or reduce_columns when not grouping, would over all of
+    them"""
+    def __init__(self, funs, group_by=None):
+        self.funs = funs
+        self.group_by = None if group_by is None else list(group_by)
+        self.states = None
+        self.empty = None
+
+    def update(self, frame):
+        if self.empty is None:
+            self.empty = frame.iloc[:0]
+        if len(frame) == 0:
+            return
+        key = self.group_by
+        if key is None:
+            key = np.zeros(len(frame), dtype=np.int8)
+        partial = _partial(frame, key, self.funs)
+        if self.states is None:
+            self.dtypes = partial.dtypes
+            self.states = partial
+        else:
+            self.states = _combine(self.states, partial)
+
+    def combine(self, other):
+        """add in the chunks passed to another PartialAggregate of the same
+        aggregates"""
+        if self.empty is None:
+            self.empty = other.empty
+        if other.states is None:
+            return
+        if self.states is None:
+            self.dtypes = other.dtypes
+            self.states = other.states
+        else:
+            self.states = _combine(self.states, other.states)
+
+    def result(self):
+        if self.states is None and self.group_by is None:
+            return reduce_columns(self.empty, self.funs)
+        if self.states is None:
+            return self.empty.groupby(self.group_by).agg(self.funs) \
+                .reset_index()
+        keys, values = [], []
+        for col, fns in self.funs.iteritems():
+            for fn in fns:
+                keys.append((col, fn))
+                values.append(self._finish(col, fn).values)
+        result = pd.DataFrame(dict(zip(keys, values)), index=self.states.index,
+                              columns=pd.MultiIndex.from_tuples(keys))
+        if self.group_by is None:
+            return result.reset_index(drop=True)
+        result.index.names = self.group_by
+        return result.reset_index()
+
+    def _finish(self, col, fn):
+        states = self.states
+        if fn in ('sum', 'min', 'max', 'count'):
+            val = states[(col, fn)]
+            if fn == 'sum':
+                val = val.where(states[(col, 'count')] > 0)
+            # values from integer columns became floats while the groups of
+            # different chunks were aligned
+            dtype = self.dtypes[(col, fn)]
+            if dtype.kind in 'iub' and val.notnull().all():
+                val = val.astype(dtype)
+            return val
+        count, total = states[(col, 'count')], states[(col, 'sum')]
+        if fn == 'mean':
+            return total / count
+        var = (states[(col, 'm2')] / (count - 1)).where(count > 1)
+        return var if fn == 'var' else np.sqrt(var)
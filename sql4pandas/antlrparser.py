@@ -0,0 +1,470 @@
+import re
+import threading
+from contextlib import contextmanager
+from antlr4 import InputStream, CommonTokenStream
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.error.ErrorListener import ErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
+from antlr4.tree.Tree import TerminalNode
+import grammar
+from sqlparser import parenthesize, parameter
+from syntax import Select, ResultColumn, Table, Join, Ordering, Column, \
+    Literal, Parameter, Function, UnaryOp, BinaryOp, Case, ARITHMETIC, COMPARISONS, \
+    BOOLEAN
+
+
+class _RaiseErrors(ErrorListener):
+    """report syntax errors as exceptions rather than printing them"""
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        raise ValueError('Syntax error at line %d:%d, %s' % (line, column, msg))
+
+
+def _text(ctx):
+    """text of a name, with any quoting removed"""
+    text = ctx.getText()
+    if len(text) > 1 and text[0] + text[-1] in ('""', '``', '[]', "''"):
+        return text[1:-1]
+    return text
+
+
+def _terminals(ctx):
+    return [child.getText().upper() for child in ctx.getChildren()
+            if isinstance(child, TerminalNode)]
+
+
+# keywords before JOIN which the grammar also takes as a table alias, RIGHT,
+# FULL and OUTER joins are only parsed this way
+_JOIN_KEYWORDS = frozenset(['LEFT', 'RIGHT', 'FULL', 'OUTER', 'INNER',
+                            'CROSS', 'NATURAL'])
+
+
+def _unsupported(ctx):
+    return ValueError('Unsupported SQL: %s' % ctx.getText())
+
+
+class ParserPool(object):
+    """lexers and parsers of the grammar kept for reuse by any thread. they
+    all predict with the grammar's shared DFA, so what one learns parsing a
+    statement speeds up the others"""
+    def __init__(self):
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def parser(self, statement):
+        """parser of the grammar reading the tokens of statement, returned
+        to the pool once done with"""
+        with self._lock:
+            recognizers = self._idle.pop() if len(self._idle) > 0 else None
+        if recognizers is None or not grammar.shares_dfa(recognizers[1]):
+            recognizers = grammar.recognizers(_RaiseErrors())
+        lexer, parser = recognizers
+        lexer.inputStream = InputStream(statement)
+        parser.setTokenStream(CommonTokenStream(lexer))
+        try:
+            yield parser
+        finally:
+            with self._lock:
+                self._idle.append(recognizers)
+
+# the pool every ANTLRParser parses with
+POOL = ParserPool()
+
+
+def warm_up(statements):
+    """parse statements representative of those to come, so the DFA is
+    already built up for them. statements that fail to parse are skipped,
+    returns the number of states added to the DFA"""
+    parser = ANTLRParser()
+    grammar.load()
+    states = grammar.dfa_states()
+    for statement in statements:
+        try:
+            parser.parse_tree(statement)
+        except ValueError:
+            pass
+    return grammar.dfa_states() - states
+
+
+class ANTLRParser(object):
+    """parses sql statements with the ANTLR SQLite grammar into a typed syntax
+    tree, which is then planned into the same data structure SQLParser
+    produces for the cursor to execute"""
+
+    def parse_statement(self, statement):
+        return self.plan(self.parse_tree(statement))
+
+    def parse_tree(self, statement):
+        """parse a statement into a syntax tree of the types in syntax"""
+        if not isinstance(statement, unicode):
+            statement = statement.decode('utf-8')
+        with POOL.parser(statement) as parser:
+            stmts = self._parse(parser).sql_stmt_list()
+            if len(stmts) != 1 or len(stmts[0].sql_stmt()) != 1:
+                raise ValueError('Expected a single statement: %s'
+                                 % statement)
+            stmt = stmts[0].sql_stmt()[0]
+            select = stmt.factored_select_stmt() \
+                or stmt.simple_select_stmt() or stmt.select_stmt()
+            if select is None or stmt.K_EXPLAIN() is not None:
+                raise _unsupported(stmt)
+            return self._select(select)
+
+    def _parse(self, parser):
+        """parse tree of a statement. it is first parsed with SLL prediction,
+        which is decided by the DFA alone once it is built up, only
+        statements which that fails on are parsed again with full LL
+        prediction"""
+        parser._interp.predictionMode = PredictionMode.SLL
+        parser._errHandler = BailErrorStrategy()
+        # SLL errors only mean the statement needs LL, so aren't reported
+        listeners, parser._listeners = parser._listeners, []
+        try:
+            return parser.parse()
+        except ParseCancellationException:
+            pass
+        finally:
+            parser._listeners = listeners
+        parser.reset()
+        parser._interp.predictionMode = PredictionMode.LL
+        parser._errHandler = DefaultErrorStrategy()
+        return parser.parse()
+
+    def _select(self, ctx):
+        """syntax tree of a select statement, factored, simple or nested"""
+        if hasattr(ctx, 'select_core'):
+            cores = ctx.select_core()
+        else:
+            cores = ctx.select_or_values()
+        if not isinstance(cores, list):
+            cores = [cores]
+        if len(cores) != 1 or ctx.K_LIMIT() is not None \
+                or ctx.K_WITH() is not None:
+            raise _unsupported(ctx)
+        select = self._core(cores[0])
+        order_by = [Ordering(self._expr(term.expr()),
+                             term.K_DESC() is not None)
+                    for term in ctx.ordering_term()]
+        return select._replace(order_by=order_by)
+
+    def _core(self, ctx):
+        if ctx.K_SELECT() is None or ctx.K_DISTINCT() is not None \
+                or ctx.K_HAVING() is not None:
+            raise _unsupported(ctx)
+        columns = []
+        for column in ctx.result_column():
+            if column.expr() is None:
+                # SELECT * or table.*
+                columns = None
+                break
+            alias = column.column_alias()
+            columns.append(ResultColumn(self._expr(column.expr()),
+                                        alias and _text(alias)))
+
+        table, joins, where, group_by = None, [], None, []
+        clause = None
+        for child in ctx.getChildren():
+            if isinstance(child, TerminalNode):
+                if child.getText().upper() in ('FROM', 'WHERE', 'GROUP'):
+                    clause = child.getText().upper()
+            elif clause == 'FROM':
+                if isinstance(child, grammar.load()[1].Join_clauseContext):
+                    table, joins = self._joins(child)
+                elif table is None:
+                    table = self._table(child)
+                else:
+                    # comma separated tables are a cross join
+                    raise _unsupported(ctx)
+            elif clause == 'WHERE':
+                where = self._expr(child)
+            elif clause == 'GROUP':
+                group_by.append(self._expr(child))
+        return Select(columns, table, joins, where, group_by, [])
+
+    def _table(self, ctx, alias=True):
+        alias = alias and ctx.table_alias() and _text(ctx.table_alias()) \
+            or None
+        if ctx.select_stmt() is not None:
+            if alias is None:
+                raise ValueError('Nested query needs an alias: %s'
+                                 % ctx.getText())
+            return Table(None, alias, self._select(ctx.select_stmt()))
+        if ctx.table_name() is None:
+            raise _unsupported(ctx)
+        name = _text(ctx.table_name())
+        return Table(name, alias or name, None)
+
+    def _joins(self, ctx):
+        tables = [self._table(tbl) for tbl in ctx.table_or_subquery()]
+        ops = [_terminals(op) for op in ctx.join_operator()]
+        for i, table in enumerate(tables[:-1]):
+            if table.alias.upper() in _JOIN_KEYWORDS and ops[i] == ['JOIN']:
+                # the grammar can take the keyword in LEFT JOIN as the alias
+                # of the table before it
+                ops[i].insert(0, table.alias.upper())
+                tables[i] = self._table(ctx.table_or_subquery(i), alias=False)
+        joins = []
+        for op, keywords, table, constraint in zip(
+                ctx.join_operator(), ops, tables[1:], ctx.join_constraint()):
+            if constraint.expr() is None or 'NATURAL' in keywords \
+                    or 'CROSS' in keywords or ',' in keywords:
+                raise _unsupported(op)
+            how = 'join' if len(keywords) == 1 else keywords[0].lower()
+            joins.append(Join(how, table, self._expr(constraint.expr())))
+        return tables[0], joins
+
+    def _expr(self, ctx):
+        """syntax tree of an expression"""
+        children = list(ctx.getChildren())
+        exprs = ctx.expr()
+        first = children[0]
+        if ctx.literal_value() is not None:
+            return Literal(ctx.getText())
+        if ctx.BIND_PARAMETER() is not None:
+            return self._parameter(ctx.BIND_PARAMETER().symbol, ctx.parser)
+        if ctx.column_name() is not None and len(exprs) == 0:
+            table = ctx.table_name() and _text(ctx.table_name())
+            return Column(table, _text(ctx.column_name()))
+        if ctx.unary_operator() is not None:
+            return UnaryOp(ctx.unary_operator().getText().upper(),
+                           self._expr(exprs[0]))
+        if ctx.function_name() is not None:
+            if ctx.K_DISTINCT() is not None:
+                raise _unsupported(ctx)
+            args = [self._expr(expr) for expr in exprs]
+            if '*' in [child.getText() for child in children]:
+                args = [Column(None, '*')]
+            return Function(_text(ctx.function_name()).lower(), args)
+        if ctx.K_CASE() is not None:
+            return self._case(ctx)
+        if isinstance(first, TerminalNode) and first.getText() == '(' \
+                and len(exprs) == 1 and len(children) == 3:
+            return self._expr(exprs[0])
+        if len(children) == 3 and len(exprs) == 2 \
+                and isinstance(children[1], TerminalNode):
+            op = children[1].getText().upper()
+            if op not in ARITHMETIC and op not in COMPARISONS \
+                    and op not in BOOLEAN:
+                raise _unsupported(ctx)
+            left, right = self._expr(exprs[0]), self._expr(exprs[1])
+            if isinstance(left, UnaryOp) and left.op == 'NOT' \
+                    and op not in BOOLEAN and exprs[0].unary_operator():
+                # the grammar binds NOT more tightly than any binary
+                # operator, while SQL only binds it more tightly than AND
+                # and OR
+                return UnaryOp('NOT', BinaryOp(op, left.operand, right))
+            return BinaryOp(op, left, right)
+        raise _unsupported(ctx)
+
+    def _parameter(self, token, parser):
+        """a bare ? is numbered by the bare ?s written before it, including
+        those of other clauses or nested queries"""
+        position = len([tkn for tkn in parser.getTokenStream().tokens
+                        if tkn.tokenIndex < token.tokenIndex
+                        and tkn.type == token.type and tkn.text == '?'])
+        return Parameter(parameter(token.text, position))
+
+    def _case(self, ctx):
+        operand, whens, default = None, [], None
+        exprs = iter(ctx.expr())
+        keyword = None
+        for child in ctx.getChildren():
+            if isinstance(child, TerminalNode):
+                keyword = child.getText().upper()
+                continue
+            expr = self._expr(next(exprs))
+            if keyword == 'CASE':
+                operand = expr
+            elif keyword == 'WHEN':
+                cond = expr
+            elif keyword == 'THEN':
+                whens.append((cond, expr))
+            elif keyword == 'ELSE':
+                default = expr
+        return Case(operand, whens, default)
+
+    def plan(self, select):
+        """data structure used to execute a statement from its syntax tree,
+        the same one SQLParser.parse_statement returns"""
+        fns = {}
+        aliases = {}
+        cases = {}
+        ops = {}
+        nested_queries = {}
+        literals = {}
+        params = set()
+        state = {'case_num': 0, 'section': 'SELECT'}
+
+        def qualified(column):
+            if column.table is None:
+                return column.name
+            return column.table + '.' + column.name
+
+        def function(node):
+            if len(node.args) != 1 or not isinstance(node.args[0], Column):
+                raise ValueError('Functions take a single column: %s'
+                                 % (node,))
+            col = qualified(node.args[0])
+            _fns = fns.setdefault(col, [])
+            if node.name not in _fns:
+                _fns.append(node.name)
+            return col, node.name
+
+        def compile_expr(node, identifiers):
+            """compile an expression into a string for numexpr, adding any
+            columns or functions it references to identifiers"""
+            def column(col, fn=None):
+                name = (col if fn is None else col+'_'+fn).replace('.', '_')
+                identifiers[name] = col, fn
+                return name
+
+            def nested(node):
+                ev_str = compile_expr(node, identifiers)
+                if isinstance(node, BinaryOp):
+                    return parenthesize(ev_str)
+                return ev_str
+
+            if isinstance(node, Column):
+                return column(qualified(node))
+            if isinstance(node, Function):
+                return column(*function(node))
+            if isinstance(node, Literal):
+                return node.text
+            if isinstance(node, Parameter):
+                params.add(node.name)
+                return node.name
+            if isinstance(node, UnaryOp):
+                op = '~' if node.op == 'NOT' else node.op
+                return op + nested(node.operand)
+            if isinstance(node, BinaryOp):
+                if node.op in BOOLEAN:
+                    op = '&' if node.op == 'AND' else '|'
+                    return nested(node.left) + ' ' + op + ' ' + \
+                        nested(node.right)
+                if node.op in COMPARISONS:
+                    op = {'=': '==', '<>': '!='}.get(node.op, node.op)
+                    return parenthesize(compile_expr(node.left, identifiers) +
+                                        ' ' + op + ' ' +
+                                        compile_expr(node.right, identifiers))
+                return nested(node.left) + ' ' + node.op + ' ' + \
+                    nested(node.right)
+            raise ValueError('Unsupported expression: %s' % (node,))
+
+        def condition(node):
+            identifiers = {}
+            return compile_expr(node, identifiers), identifiers
+
+        def operation(node, as_name=None):
+            expr = condition(node)
+            if as_name is None:
+                as_name = re.sub(r'[\s()+\-*/%<>=!&|~]', '', expr[0])
+            ops.setdefault(state['section'], []).append(
+                {'as_name': as_name, 'expr': expr})
+            return as_name, None
+
+        def identifier(node, as_name=None):
+            """(col, fn) identifier of an expression within the executing
+            frame, registering any aliases, literals, operations or case
+            statements it needs"""
+            if isinstance(node, Column):
+                col = qualified(node)
+                if node.table is None:
+                    # resolved against the columns of every table
+                    aliases[col] = None, None
+                if as_name is None:
+                    return col, None
+                aliases[as_name] = col, None
+            elif isinstance(node, Function):
+                col, fn = function(node)
+                if as_name is None:
+                    return col, fn
+                aliases[as_name] = col, fn
+            elif isinstance(node, Literal):
+                literals[as_name or node.text] = node.text
+                return as_name or node.text, None
+            elif isinstance(node, Case):
+                return parse_case(node, as_name)
+            else:
+                return operation(node, as_name)
+            return as_name, None
+
+        def parse_case(node, as_name=None):
+            if as_name is None:
+                state['case_num'] += 1
+                as_name = 'case' + str(state['case_num'])
+            stmts = []
+            for cond, result in node.whens:
+                if node.operand is not None:
+                    cond = BinaryOp('=', node.operand, cond)
+                stmts.append((condition(cond), identifier(result)))
+            case = {'as_name': as_name,
+                    # statements are applied in reverse so the first
+                    # matching WHEN takes precedence
+                    'stmts': stmts[::-1]}
+            if node.default is not None:
+                case['else_stmt'] = identifier(node.default)
+            cases.setdefault(state['section'], []).append(case)
+            return as_name, None
+
+        def conjuncts(node):
+            if isinstance(node, BinaryOp) and node.op == 'AND':
+                return conjuncts(node.left) + conjuncts(node.right)
+            return [condition(node)]
+
+        def parse_table(table):
+            if table.query is None:
+                return table.name, table.alias
+            name = '###temp_' + table.alias
+            nested_queries[name] = self.plan(table.query)
+            params.update(nested_queries[name]['PARAMS'])
+            return name, table.alias
+
+        def parse_join(join):
+            right, right_identifier = parse_table(join.table)
+            on = join.on
+            if not isinstance(on, BinaryOp) or on.op not in ('=', '==') \
+                    or not isinstance(on.left, Column) \
+                    or not isinstance(on.right, Column):
+                raise ValueError('Joins must be on an equality of two '
+                                 'columns: %s' % (on,))
+            return (right, join.how, qualified(on.left), qualified(on.right),
+                    right_identifier)
+
+        _parsed = {}
+        if select.columns is not None:
+            _parsed['SELECT'] = [identifier(column.expr, column.alias)
+                                 for column in select.columns]
+        else:
+            _parsed['SELECT'] = None
+        if select.table is not None:
+            _parsed['FROM'] = parse_table(select.table)
+        joins = [parse_join(join) for join in select.joins]
+        if select.where is not None:
+            state['section'] = 'WHERE'
+            _parsed['WHERE'] = condition(select.where)
+            _parsed['CONJUNCTS'] = conjuncts(select.where)
+        if len(select.group_by) > 0:
+            state['section'] = 'GROUP'
+            _parsed['GROUP'] = tuple(identifier(expr)[0]
+                                     for expr in select.group_by)
+        if len(select.order_by) > 0:
+            state['section'] = 'ORDER'
+            order = []
+            for ordering in select.order_by:
+                col, fn = identifier(ordering.expr)
+                order.append(col if fn is None else (col, fn))
+            _parsed['ORDER'] = order
+            _parsed['ASCENDING'] = [not ordering.descending
+                                    for ordering in select.order_by]
+
+        _parsed['FUNCTIONS'] = fns
+        _parsed['JOINS'] = joins
+        _parsed['ALIASES'] = aliases
+        _parsed['CASES'] = cases
+        _parsed['NESTED_QUERIES'] = nested_queries
+        _parsed['OPS'] = ops
+        _parsed['LITERALS'] = literals
+        _parsed.setdefault('CONJUNCTS', [])
+        _parsed['PARAMS'] = sorted(params)
+        return _parsed
@@ -0,0 +1,151 @@
+import re
+import numpy as np
+from join import HashIndex
+from planner import strings_in, combine_conditions
+
+# a comparison of two operands as written out by the parsers
+_COMPARISON = re.compile(r'^\((\w+) (==|!=|<=|>=|<|>) (\w+)\)$')
+# operator of a comparison with its operands swapped
+_FLIPPED = {'==': '==', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+_WORD = re.compile(r'\w+')
+
+
+def references(obj, names):
+    """whether anything in a parsed statement refers to one of names"""
+    names = set(names)
+    return any(not names.isdisjoint(_WORD.findall(string))
+               for string in strings_in(obj))
+
+
+def varying_conditions(parsed, names):
+    """split the WHERE clause of a statement into the conditions that don't
+    depend on its parameters and those that do, so every set of parameters
+    can share the rows left by the first. None if parameters are referenced
+    anywhere else the rows are decided, which needs the whole statement run
+    for each set"""
+    if 'INTO' in parsed or references(parsed.get('NESTED_QUERIES'), names):
+        return None
+    for section in 'OPS', 'CASES':
+        for keyword in 'FROM', 'WHERE':
+            if references(parsed.get(section, {}).get(keyword), names):
+                return None
+    conds = parsed.get('CONJUNCTS') or []
+    if len(conds) == 0 and parsed.get('WHERE') is not None:
+        conds = [parsed['WHERE']]
+    fixed, varying = [], []
+    for cond in conds:
+        (varying if references(cond, names) else fixed).append(cond)
+    return fixed, varying
+
+
+class SortedIndex(object):
+    """numeric values sorted once, so the rows within any range of values
+    can be found with a binary search. nulls are left out as they never
+    compare true"""
+    def __init__(self, values):
+        values = values.astype(float)
+        order = np.argsort(values, kind='mergesort')
+        # argsort puts nan last
+        order = order[:len(order) - np.isnan(values).sum()]
+        self.order = order
+        self.values = values[order]
+
+    def rows(self, bounds):
+        """positions of the rows whose value compares true to every (op,
+        value) pair of bounds"""
+        start, stop = 0, len(self.order)
+        for op, value in bounds:
+            side = 'left' if op in ('<', '>=') else 'right'
+            split = np.searchsorted(self.values, value, side=side)
+            if op in ('<', '<='):
+                stop = min(stop, split)
+            else:
+                start = max(start, split)
+        return self.order[start:max(start, stop)]
+
+
+def _lookup(cond, names, frame):
+    """(col, op, param) of a condition comparing a column of the frame to a
+    parameter, with a range only compared for numeric columns. None for any
+    other condition"""
+    ev_str, identifiers = cond
+    match = _COMPARISON.match(ev_str)
+    if match is None:
+        return None
+    left, op, right = match.groups()
+    if left in names and right in identifiers:
+        left, op, right = right, _FLIPPED.get(op), left
+    if op not in _FLIPPED or left not in identifiers or right not in names:
+        return None
+    col, fn = identifiers[left]
+    if fn is not None or col not in frame.columns:
+        return None
+    if op != '==' and frame[col].dtype.kind not in 'biuf':
+        return None
+    return col, op, right
+
+
+def _index(frame, lookups):
+    """function from a set of parameters to the rows of frame matching
+    lookups, (col, op, param) conditions on a single column, through an
+    index built once over the column"""
+    col = lookups[0][0]
+    values = frame[col].values
+    if lookups[0][1] == '==':
+        index = HashIndex(values)
+        param = lookups[0][2]
+        return lambda params: index.rows(params[param])
+    index = SortedIndex(values)
+    return lambda params: index.rows([(op, params[param])
+                                      for col, op, param in lookups])
+
+
+def _in_order(rows, size):
+    """positions of rows back in the order of the frame, as a filter would
+    leave them"""
+    if len(rows) * 32 < size:
+        return np.sort(rows)
+    mask = np.zeros(size, dtype=bool)
+    mask[rows] = True
+    return np.flatnonzero(mask)
+
+
+def select_rows(frame, conds, names, param_sets, evaluate):
+    """positions of the rows of frame matching conds for each set of
+    parameters. conditions comparing a column to a parameter are looked up
+    in an index over the column, built once for every set, preferring a
+    column compared with = to one compared to a range. the rest are
+    evaluated for each set over only the rows the lookup leaves.
+    evaluate(cond, rows, params) is the boolean mask of cond over a frame of
+    rows"""
+    columns, rest = {}, []
+    for cond in conds:
+        lookup = _lookup(cond, names, frame)
+        if lookup is None:
+            rest.append(cond)
+        else:
+            columns.setdefault(lookup[0], []).append((lookup, cond))
+    rows = None
+    if len(columns) > 0:
+        col = min(columns, key=lambda col: min(
+            lookup[1] != '==' for lookup, cond in columns[col]))
+        lookups = [lookup for lookup, cond in columns[col]]
+        equals = [lookup for lookup in lookups if lookup[1] == '==']
+        rows = _index(frame, equals[:1] or lookups)
+        for lookup, cond in columns.pop(col):
+            if len(equals) > 0 and lookup is not equals[0]:
+                rest.append(cond)
+        rest.extend(cond for pairs in columns.itervalues()
+                    for lookup, cond in pairs)
+    rest = combine_conditions(rest)
+    selected = []
+    for params in param_sets:
+        if rows is None:
+            positions = np.arange(len(frame))
+        else:
+            positions = _in_order(rows(params), len(frame))
+        if rest is not None:
+            mask = evaluate(rest, frame.take(positions), params)
+            positions = positions[np.asarray(mask, dtype=bool)]
+        selected.append(positions)
+    return selected
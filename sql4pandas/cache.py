@@ -0,0 +1,76 @@
+import re
+from collections import OrderedDict
+
+# matches single or double quoted string literals, including escaped quotes
+# written SQL style by doubling them
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+_SPACE = re.compile(r"\s+")
+# a comment running to the end of its line
+_COMMENT = re.compile(r"--[^\n]*")
+
+
+def normalize(statement):
+    """collapse runs of whitespace outside of string literals and strip any
+    trailing semicolon, so that differently formatted copies of the same
+    statement share a cache entry. line comments are dropped, as once lines
+    are joined they would run on to the end of the statement"""
+    parts = _QUOTED.split(statement.strip().rstrip(';'))
+    # split with a capturing group puts literals at the odd indices
+    parts[::2] = [_SPACE.sub(' ', _COMMENT.sub(' ', part))
+                  for part in parts[::2]]
+    return ''.join(parts).strip()
+
+
+class PlanCache(object):
+    """bounded LRU cache of parsed statements keyed on normalized statement
+    text. a maxsize of 0 disables caching"""
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+
+    def __len__(self):
+        return len(self._plans)
+
+    def __contains__(self, statement):
+        return normalize(statement) in self._plans
+
+    def get(self, statement, parse):
+        """return the plan cached for statement, calling parse on the
+        statement to build and cache it on a miss. the normalized text is only
+        the key, statements being parsed as written"""
+        plan = self.lookup(statement)
+        if plan is None:
+            plan = self.add(statement, parse(statement))
+        return plan
+
+    def lookup(self, statement):
+        """the plan cached for statement, None if it isn't cached"""
+        key = normalize(statement)
+        plan = self._plans.pop(key, None)
+        if plan is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # re-insert so most recently used entries sit at the end
+        self._plans[key] = plan
+        return plan
+
+    def add(self, statement, plan):
+        """cache the plan of a statement, returning the plan already cached
+        for it instead when there is one"""
+        if self.maxsize == 0:
+            return plan
+        plan = self._plans.setdefault(normalize(statement), plan)
+        while len(self._plans) > self.maxsize:
+            self._plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        self._plans.clear()
+        self.hits = self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._plans), 'maxsize': self.maxsize}
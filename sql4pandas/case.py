@@ -0,0 +1,63 @@
+import numexpr as ne
+import numpy as np
+from ast import literal_eval
+
+
+def literal_value(text):
+    """value of a literal as written in SQL"""
+    try:
+        return literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def _values(val):
+    return np.asarray(getattr(val, 'values', val))
+
+
+def _numeric(val):
+    return val.dtype.kind in 'biuf'
+
+
+def _fused(conditions, values, default, local_dict):
+    """every branch nested into one numexpr where, so the whole CASE is
+    evaluated in a single pass over the rows"""
+    local_dict = dict(local_dict)
+    expr = '_else'
+    local_dict['_else'] = default
+    for i in reversed(xrange(len(conditions))):
+        local_dict['_then%d' % i] = values[i]
+        expr = 'where(%s, _then%d, %s)' % (conditions[i], i, expr)
+    return ne.evaluate(expr, local_dict=local_dict, truediv=True)
+
+
+def evaluate_case(conditions, values, default, local_dict, evaluate):
+    """evaluate a CASE over the rows of its columns. conditions are the
+    numexpr strings of each WHEN with values the result of its THEN, either
+    a scalar or a column, and default the ELSE result or None. local_dict
+    holds the columns referenced by conditions, evaluate is used to compute
+    a condition on its own when the branches can't be fused. the first
+    condition to hold for a row chooses its value"""
+    values = [_values(val) for val in values]
+    default = _values(default)
+    if default.ndim == 0 and default.item() is None:
+        # a missing ELSE is NULL, NaN when every THEN is numeric
+        default = _values(np.nan)
+        if not all(_numeric(val) for val in values):
+            default = _values(None)
+    if all(_numeric(val) for val in values + [default]):
+        try:
+            arrays = dict((k, _values(v)) for k, v in local_dict.iteritems())
+            result = _fused(conditions, values, default, arrays)
+            if result.ndim > 0:
+                return result
+        except (KeyError, SyntaxError, TypeError, ValueError,
+                NotImplementedError):
+            # conditions comparing strings or calling functions numexpr
+            # doesn't support
+            pass
+    else:
+        values = [val.astype(object) for val in values]
+        default = default.astype(object)
+    masks = [_values(evaluate(cond)).astype(bool) for cond in conditions]
+    return np.select(masks, values, default)
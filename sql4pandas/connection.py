@@ -0,0 +1,153 @@
+import threading
+import weakref
+# the cursor module imports this one, so PandasCursor is looked up on use.
+# importing it here rather than in cursor() keeps threads from waiting on
+# the import lock
+import sql4pandas
+from cache import PlanCache
+from join import HashIndex
+from sqlparser import SQLParser
+
+
+class Connection(object):
+    """catalog of pandas dataframes shared by any number of cursors, each
+    created by cursor(). the connection holds what cursors share, the tables,
+    the cache of parsed statements and the indexes declared on the tables,
+    while every cursor keeps its own result and the temporary tables of the
+    statement it is executing, so cursors on one connection can execute
+    statements on different threads at once. statements only ever replace a
+    table of the catalog, through SELECT INTO, and never modify one in place.
+    cache_size, join, parser and on_stats are as for PandasCursor, on_stats
+    being called from whichever thread executed the statement"""
+    def __init__(self, dfs, cache_size=128, join='hash', parser='sqlparse',
+                 on_stats=None):
+        self.db = dfs
+        self.plan_cache = PlanCache(cache_size)
+        self.join = join
+        self._parser = parser
+        self.on_stats = on_stats
+        # hash indexes declared through create_index, keyed on
+        # (table, column) and holding a weak reference to the table the
+        # index was built over along with the index itself
+        self.indexes = {}
+        # counts of distinct values of the columns joins are on, which join
+        # ordering estimates the rows of a join from, keyed and held as the
+        # indexes are
+        self.distincts = {}
+        # guards the plan cache, indexes and distinct counts, which cursors
+        # update as they execute statements. it is only held to look in and
+        # update them, parsing and building happening outside it so cursors
+        # don't wait on each other's work
+        self._lock = threading.RLock()
+
+    def cursor(self, chunksize=None, processes=None):
+        """new cursor over the tables of the connection"""
+        return sql4pandas.PandasCursor(self, chunksize=chunksize,
+                                       processes=processes)
+
+    @property
+    def parser(self):
+        return self._parser
+
+    @parser.setter
+    def parser(self, parser):
+        # the plans cached were parsed by the parser being replaced
+        with self._lock:
+            if parser != self._parser:
+                self.plan_cache.clear()
+            self._parser = parser
+
+    def plan(self, statement):
+        """parsed statement, from the plan cache when it has been parsed
+        before. when two cursors parse a statement at once the plan cached
+        first is kept"""
+        with self._lock:
+            plan = self.plan_cache.lookup(statement)
+        if plan is None:
+            parser = self._parser
+            plan = self._parse(statement, parser)
+            with self._lock:
+                # unless the parser was switched while parsing
+                if parser == self._parser:
+                    plan = self.plan_cache.add(statement, plan)
+        return plan
+
+    def _parse(self, statement, parser):
+        if parser == 'antlr':
+            # antlr4 is only needed by this parser
+            from antlrparser import ANTLRParser
+            return ANTLRParser().parse_statement(statement)
+        return SQLParser().parse_statement(statement)
+
+    def cache_info(self):
+        """hits, misses, current size and maxsize of the plan cache"""
+        with self._lock:
+            return self.plan_cache.info()
+
+    def create_index(self, table, column):
+        """declare a hash index on a column of a table. the index is built
+        once and then used by joins on the column and by WHERE filters
+        comparing the column to a literal with =. it is rebuilt on first use
+        after the table is replaced in self.db, but tables modified in place
+        need their index dropped and recreated"""
+        with self._lock:
+            self.indexes[(table, column)] = None
+        self.index(table, column)
+
+    def drop_index(self, table, column):
+        with self._lock:
+            del self.indexes[(table, column)]
+
+    def index(self, table, column):
+        """index declared on a column of a table, built over the table
+        currently in self.db. None if no index is declared or the table no
+        longer has the column"""
+        if (table, column) not in self.indexes:
+            return None
+        frame = self.db[table]
+        if column not in frame.columns:
+            return None
+        return self._built(self.indexes, (table, column), frame,
+                           lambda: HashIndex(frame[column].values))
+
+    def distinct(self, table, column):
+        """count of distinct values of a column of a table, counted once for
+        the table currently in self.db. the rows of the table if it doesn't
+        have the column"""
+        frame = self.db[table]
+        if column not in frame.columns:
+            return len(frame)
+        return self._built(self.distincts, (table, column), frame,
+                           frame[column].nunique)
+
+    def _built(self, entries, key, frame, build):
+        """what build() gives for frame, the table key[0], kept in entries
+        under key along with a weak reference to the frame it was built for.
+        build runs outside the lock, and when two threads build the same
+        entry the one stored first is kept. it is only stored while frame is
+        still the table of self.db, and for indexes while one is declared"""
+        with self._lock:
+            built = entries.get(key)
+        if built is not None and built[0]() is frame:
+            return built[1]
+        value = build()
+        with self._lock:
+            built = entries.get(key)
+            if built is not None and built[0]() is frame:
+                return built[1]
+            if self.db.get(key[0]) is frame and \
+                    (entries is not self.indexes or key in entries):
+                entries[key] = weakref.ref(frame), value
+        return value
+
+    def replace(self, table, frame):
+        """replace a table of the catalog, discarding the indexes built over
+        the table it replaces"""
+        with self._lock:
+            self.db[table] = frame
+            for key in self.indexes:
+                if key[0] == table:
+                    self.indexes[key] = None
+            for key in self.distincts.keys():
+                if key[0] == table:
+                    del self.distincts[key]
@@ -0,0 +1,287 @@
+import re
+import pandas as pd
+from join import JOIN_TYPES
+from planner import pushdown_predicates, equality, streamable, aggregable, \
+    order_joins
+
+# EXPLAIN or EXPLAIN ANALYZE in front of a statement
+_EXPLAIN = re.compile(r'^\s*EXPLAIN(\s+ANALYZE)?\s+', re.IGNORECASE)
+# columns of the frame EXPLAIN returns, EXPLAIN ANALYZE adding the stage
+# totals of each operator
+COLUMNS = ['id', 'parent', 'operator', 'detail', 'implementation']
+ANALYZED = ['calls', 'seconds', 'rows_in', 'rows_out', 'bytes']
+
+
+def explain_mode(statement):
+    """None, 'EXPLAIN' or 'ANALYZE' as statement is preceded by nothing,
+    EXPLAIN or EXPLAIN ANALYZE, along with the statement that follows"""
+    match = _EXPLAIN.match(statement)
+    if match is None:
+        return None, statement
+    mode = 'EXPLAIN' if match.group(1) is None else 'ANALYZE'
+    return mode, statement[match.end():]
+
+
+def _columns(parsed, catalog):
+    """names of the columns of each table a statement reads, keyed on the
+    identifier it reads them as. nested queries have the columns they
+    select"""
+    tables = [parsed['FROM']] if 'FROM' in parsed else []
+    tables += [(j[0], j[-1]) for j in parsed.get('JOINS', [])]
+    columns = {}
+    for table, identifier in tables:
+        nested = parsed.get('NESTED_QUERIES', {}).get(table)
+        if nested is None:
+            columns[identifier] = catalog[table].columns
+        else:
+            columns[identifier] = [col.split('.')[-1] for col, fn
+                                   in nested.get('SELECT') or []]
+    return columns
+
+
+def _cond(cond):
+    """a condition as written out for numexpr, with its variables named as
+    the columns they stand for"""
+    ev_str, identifiers = cond
+
+    def name(match):
+        var = match.group()
+        if var not in identifiers:
+            return var
+        col, fn = identifiers[var]
+        return col if fn is None else '%s(%s)' % (fn.upper(), col)
+    return re.sub(r'\w+', name, ev_str)
+
+
+def _node(operator, detail, implementation, stage=None, children=()):
+    return {'operator': operator, 'detail': detail,
+            'implementation': implementation, 'stage': stage,
+            'children': [child for child in children if child is not None]}
+
+
+def _query(parsed, catalog, options, query=''):
+    """operator tree of a parsed statement, the root being the last operator
+    to run. query names the nested query the operators belong to"""
+    pushed, residual = pushdown_predicates(parsed, _columns(parsed, catalog))
+    nested = parsed.get('NESTED_QUERIES', {})
+    parts = options['chunksize'] is not None \
+        or options['processes'] is not None
+
+    def scan(table, identifier, stage):
+        conds = pushed.get(identifier, [])
+        if table in nested or table == identifier:
+            # nested queries are only known by their alias
+            detail = identifier
+        else:
+            detail = '%s AS %s' % (table, identifier)
+        implementation = 'columns renamed without copying'
+        for cond in conds:
+            lookup = equality(cond)
+            if lookup is not None and table not in nested \
+                    and lookup[0].startswith(identifier + '.') and \
+                    (table, lookup[0][len(identifier) + 1:]) \
+                    in options['indexes']:
+                implementation = 'HashIndex lookup on %s' % lookup[0]
+                break
+        if len(conds) > 0:
+            detail += ' WHERE ' + ' AND '.join(_cond(c) for c in conds)
+            implementation += ', filtered with pd.eval'
+        if stage == 'FROM':
+            if options['chunksize'] is not None and (
+                    streamable(parsed) and options['processes'] is None
+                    or aggregable(parsed)):
+                implementation += ', %d rows at a time' % options['chunksize']
+            if options['processes'] is not None and (
+                    streamable(parsed) or aggregable(parsed)):
+                implementation += ', partitioned over up to %d processes' \
+                    % options['processes']
+        children = []
+        if table in nested:
+            children.append(_node(
+                'SUBQUERY', identifier, 'result renamed into a temporary '
+                'table of the cursor', None,
+                # nested queries run whole, never in chunks or partitions
+                [_query(nested[table], catalog,
+                        dict(options, chunksize=None, processes=None),
+                        query + '/' + table)]))
+        return _node('SCAN', detail, implementation, stage, children)
+
+    def compute(keyword, node):
+        ops = parsed.get('OPS', {}).get(keyword, [])
+        if len(ops) > 0:
+            node = _node('COMPUTE', ', '.join(
+                '%s AS %s' % (_cond(op['expr']), op['as_name'])
+                for op in ops), 'pd.eval', 'OPS', [node])
+        cases = parsed.get('CASES', {}).get(keyword, [])
+        if len(cases) > 0:
+            node = _node('CASE', ', '.join(case['as_name'] for case in cases),
+                         'evaluate_case', 'CASE', [node])
+        return node
+
+    node = None
+    if 'FROM' in parsed:
+        node = scan(parsed['FROM'][0], parsed['FROM'][1], 'FROM')
+        # joins in the order the executor applies them
+        joins = parsed.get('JOINS', [])
+        if options['distinct'] is not None:
+            joins = order_joins(parsed, catalog, options['distinct'])
+        for right, how, left_on, right_on, right_identifier in joins:
+            how = JOIN_TYPES.get(how, how)
+            if options['join'] == 'merge':
+                implementation = 'DataFrame.merge'
+            else:
+                implementation = 'hash_join, HashIndex built over the ' \
+                    'smaller side or a declared index reused'
+            node = _node('JOIN', '%s ON %s = %s' % (how.upper(), left_on,
+                                                    right_on),
+                         implementation, 'JOIN',
+                         [node, scan(right, right_identifier, None)])
+    node = compute('FROM', node)
+    node = compute('WHERE', node)
+    if residual is not None and 'WHERE' in parsed:
+        node = _node('FILTER', _cond(residual), 'pd.eval boolean mask',
+                     'WHERE', [node])
+    node = compute('GROUP', node)
+    fns = parsed.get('FUNCTIONS', {})
+    if parsed.get('GROUP', None) is not None or len(fns) > 0:
+        aggregates = ', '.join('%s(%s)' % (fn.upper(), col)
+                               for col, _fns in sorted(fns.iteritems())
+                               for fn in _fns)
+        if parsed.get('GROUP', None) is not None:
+            detail = 'GROUP BY ' + ', '.join(parsed['GROUP'])
+            implementation = 'DataFrame.groupby().agg'
+        else:
+            detail = 'global'
+            implementation = 'reduce_columns'
+        if parts and aggregable(parsed):
+            implementation = 'PartialAggregate combined over chunks or ' \
+                'partitions'
+        if len(aggregates) > 0:
+            detail += ': ' + aggregates
+        node = _node('AGGREGATE', detail, implementation, 'GROUP', [node])
+    node = compute('ORDER', node)
+    if parsed.get('ORDER', None) is not None:
+        order = [col if isinstance(col, basestring) else col[0]
+                 for col in parsed['ORDER']]
+        ascending = parsed.get('ASCENDING', True)
+        if not isinstance(ascending, list):
+            ascending = [ascending] * len(order)
+        node = _node('SORT', ', '.join(
+            col + ('' if asc else ' DESC')
+            for col, asc in zip(order, ascending)), 'DataFrame.sort_values',
+            'ORDER', [node])
+    node = compute('SELECT', node)
+    select = parsed.get('SELECT', None)
+    node = _node('PROJECT', '*' if select is None else ', '.join(
+        col if fn is None else '%s(%s)' % (fn.upper(), col)
+        for col, fn in select), 'DataFrame assembled from the columns',
+        'SELECT', [node])
+    if 'INTO' in parsed:
+        node = _node('INTO', parsed['INTO'], 'Connection.replace', None,
+                     [node])
+    for n in _walk(node):
+        # operators of nested queries already belong to them
+        n.setdefault('query', query)
+    return node
+
+
+def _walk(node):
+    yield node
+    for child in node['children']:
+        for n in _walk(child):
+            yield n
+
+
+def explain(parsed, catalog, join='hash', indexes=(), chunksize=None,
+            processes=None, distinct=None):
+    """operator tree of a parsed statement as a frame of one row per
+    operator, parents before their children. catalog holds the tables the
+    statement reads, and the rest are the options of the cursor which
+    decide how each operator is carried out. given distinct, the counting
+    function of Connection, joins are listed in the order they are applied
+    rather than as written"""
+    options = {'join': join, 'indexes': set(indexes),
+               'chunksize': chunksize, 'processes': processes,
+               'distinct': distinct}
+    rows = []
+
+    def add(node, parent):
+        rows.append([len(rows), parent, node['operator'], node['detail'],
+                     node['implementation'], node['stage'], node['query']])
+        me = rows[-1][0]
+        for child in node['children']:
+            add(child, me)
+    add(_query(parsed, catalog, options), None)
+    return pd.DataFrame(rows, columns=COLUMNS + ['stage', 'query'])
+
+
+def _own(stats):
+    """stage totals of a query leaving out those of its nested queries,
+    which were merged into them"""
+    own = dict((stage, dict(totals)) for stage, totals
+               in stats.stages.iteritems())
+    for nested in stats.nested.itervalues():
+        for stage, totals in nested.stages.iteritems():
+            for k, v in totals.iteritems():
+                own[stage][k] -= v
+    return own
+
+
+def _stats_of(stats, query):
+    """statistics of the nested query at the path query"""
+    for ident in query.split('/')[1:]:
+        stats = stats.nested.get(ident)
+        if stats is None:
+            return None
+    return stats
+
+
+def analyze(plan, stats):
+    """the frame of explain with each operator annotated with the totals of
+    the stage that carried it out, from the QueryStats of executing the
+    statement. joins are annotated with their own rows and time, the other
+    operators sharing a stage with the first of them"""
+    plan = plan.copy()
+    for col in ANALYZED:
+        plan[col] = float('nan')
+    for query, operators in plan.groupby('query', sort=False):
+        of = _stats_of(stats, query)
+        if of is None:
+            continue
+        own = _own(of)
+        # the joins of nested queries come before those of the query
+        joins = of.joins[len(of.joins) - (operators['operator'] ==
+                                          'JOIN').sum():]
+        seen = set()
+        for i, row in operators.iterrows():
+            stage = row['stage']
+            if row['operator'] == 'JOIN' and len(joins) > 0:
+                # parents come first, so the last join applied is met first
+                join = joins.pop()
+                plan.loc[i, ANALYZED[:4]] = [
+                    1, join.get('seconds', float('nan')),
+                    join['left_rows'] + join['right_rows'], join['rows']]
+            elif stage in own and stage not in seen:
+                plan.loc[i, ANALYZED] = [own[stage][col] for col in ANALYZED]
+            seen.add(stage)
+    return plan
+
+
+def format_plan(plan):
+    """the frame of explain or analyze as indented text, one line per
+    operator"""
+    depth = {}
+    lines = []
+    for i, row in plan.iterrows():
+        depth[row['id']] = 0 if pd.isnull(row['parent']) \
+            else depth[row['parent']] + 1
+        line = '%s%s %s  [%s]' % ('  ' * depth[row['id']], row['operator'],
+                                  row['detail'], row['implementation'])
+        if 'seconds' in plan and not pd.isnull(row['seconds']):
+            line += '  (%.6fs, rows %d -> %d' % (
+                row['seconds'], row['rows_in'], row['rows_out'])
+            if not pd.isnull(row['bytes']):
+                line += ', %+d bytes' % row['bytes']
+            line += ')'
+        lines.append(line)
+    return '\n'.join(lines)
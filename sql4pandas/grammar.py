@@ -0,0 +1,186 @@
+import atexit
+import cPickle
+import hashlib
+import os
+import tempfile
+import threading
+from antlr4 import InputStream, CommonTokenStream
+from antlr4.PredictionContext import PredictionContext, PredictionContextCache
+from antlr4.atn.ATNSimulator import ATNSimulator
+from antlr4.atn.LexerATNSimulator import LexerATNSimulator
+from antlr4.atn.ParserATNSimulator import ParserATNSimulator
+from antlr4.atn.ATNState import ATNState
+from antlr4.atn.SemanticContext import SemanticContext
+
+# file the prediction DFA of the SQLite grammar is kept in between
+# processes, loaded with the grammar and saved on exit once parsing has added
+# to it. only kept when SQL4PANDAS_DFA_CACHE is set to a path, such as
+# ~/.cache/sql4pandas/SQLite.dfa
+DFA_CACHE = os.path.expanduser(os.environ.get('SQL4PANDAS_DFA_CACHE', ''))
+
+_grammar = {}
+# held while adding to the DFA, which is shared by every lexer and parser
+_lock = threading.RLock()
+
+# objects of the antlr4 runtime which it compares by identity, so they must be
+# the same objects once a DFA is loaded
+_SINGLETONS = {'NONE': SemanticContext.NONE,
+               'EMPTY': PredictionContext.EMPTY,
+               'ERROR': ATNSimulator.ERROR}
+
+
+def load():
+    """the generated SQLite lexer and parser classes. the grammar modules
+    deserialize their ATN when imported, so they are only imported the first
+    time they are needed, at which point any cached DFA is loaded too"""
+    if 'loaded' not in _grammar:
+        with _lock:
+            if 'loaded' not in _grammar:
+                _load()
+    return _grammar['lexer'], _grammar['parser']
+
+
+def _load():
+    from SQLiteLexer import SQLiteLexer
+    from SQLiteParser import SQLiteParser
+    _grammar['lexer'], _grammar['parser'] = SQLiteLexer, SQLiteParser
+    if DFA_CACHE:
+        _load_dfa(DFA_CACHE)
+        _grammar['states'] = dfa_states()
+        atexit.register(_save_grown)
+    # set last, other threads wait on the lock until it is
+    _grammar['loaded'] = True
+
+
+class _LexerSimulator(LexerATNSimulator):
+    """lexer simulator which only adds to the shared DFA under a lock"""
+    def addDFAEdge(self, from_, tk, to=None, cfgs=None):
+        with _lock:
+            return super(_LexerSimulator, self).addDFAEdge(from_, tk, to,
+                                                           cfgs)
+
+    def addDFAState(self, configs):
+        with _lock:
+            return super(_LexerSimulator, self).addDFAState(configs)
+
+
+class _ParserSimulator(ParserATNSimulator):
+    """parser simulator which only adds to the shared DFA under a lock"""
+    def addDFAEdge(self, dfa, from_, t, to):
+        with _lock:
+            return super(_ParserSimulator, self).addDFAEdge(dfa, from_, t, to)
+
+    def addDFAState(self, dfa, D):
+        with _lock:
+            return super(_ParserSimulator, self).addDFAState(dfa, D)
+
+
+def recognizers(error_listener=None):
+    """a new lexer and parser of the grammar, which can be shared by
+    threads. error_listener replaces the listeners reporting syntax errors
+    to the console"""
+    SQLiteLexer, SQLiteParser = load()
+    lexer = SQLiteLexer(InputStream(u''))
+    lexer._interp = _LexerSimulator(lexer, lexer.atn, lexer.decisionsToDFA,
+                                    PredictionContextCache())
+    parser = SQLiteParser(CommonTokenStream(lexer))
+    parser._interp = _ParserSimulator(parser, parser.atn,
+                                      parser.decisionsToDFA,
+                                      parser.sharedContextCache)
+    for recognizer in lexer, parser:
+        recognizer.removeErrorListeners()
+        if error_listener is not None:
+            recognizer.addErrorListener(error_listener)
+    return lexer, parser
+
+
+def shares_dfa(parser):
+    """whether a parser still predicts with the grammar's DFA, which it
+    doesn't once another DFA has been loaded"""
+    return parser._interp.decisionToDFA is _grammar['parser'].decisionsToDFA
+
+
+def dfa_states():
+    """number of states in the prediction DFA of the lexer and parser"""
+    return sum(len(dfa._states) for name in ('lexer', 'parser')
+               for dfa in _grammar[name].decisionsToDFA)
+
+
+def _key():
+    """identifies the grammar a cached DFA was built for"""
+    digest = hashlib.sha1()
+    for name in 'lexer', 'parser':
+        module = __import__(_grammar[name].__module__, fromlist=['*'])
+        digest.update(module.serializedATN().encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _persistent_id(obj):
+    # DFA states refer to states of the ATN, which are stored by number as
+    # the ATN is already deserialized by the grammar modules
+    if isinstance(obj, ATNState):
+        for name in 'lexer', 'parser':
+            if obj.atn is _grammar[name].atn:
+                return '%s %d' % (name, obj.stateNumber)
+    for name, singleton in _SINGLETONS.iteritems():
+        if obj is singleton:
+            return name
+    return None
+
+
+def _persistent_load(pid):
+    if pid in _SINGLETONS:
+        return _SINGLETONS[pid]
+    name, number = pid.split()
+    return _grammar[name].atn.states[int(number)]
+
+
+def save_dfa(path):
+    """write the prediction DFA built up by parsing so far to path, so other
+    processes can start with it rather than an empty one"""
+    load()
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    # written to a temporary file first so processes never read a partially
+    # written cache
+    fd, tmp = tempfile.mkstemp(dir=directory or None)
+    with os.fdopen(fd, 'wb') as f:
+        pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = _persistent_id
+        with _lock:
+            pickler.dump((_key(), [_grammar[name].decisionsToDFA
+                                   for name in ('lexer', 'parser')]))
+    os.rename(tmp, path)
+
+
+def load_dfa(path):
+    """replace the prediction DFA with the one saved to path, returns False
+    if there is none or it was saved for a different grammar"""
+    load()
+    with _lock:
+        return _load_dfa(path)
+
+
+def _load_dfa(path):
+    try:
+        with open(path, 'rb') as f:
+            unpickler = cPickle.Unpickler(f)
+            unpickler.persistent_load = _persistent_load
+            key, dfas = unpickler.load()
+    except Exception:
+        # a missing, truncated or foreign file, which is rebuilt by parsing
+        return False
+    if key != _key():
+        return False
+    _grammar['lexer'].decisionsToDFA, _grammar['parser'].decisionsToDFA = dfas
+    return True
+
+
+def _save_grown():
+    """save the DFA on exit when parsing has added to it"""
+    if dfa_states() > _grammar['states']:
+        try:
+            save_dfa(DFA_CACHE)
+        except (IOError, OSError):
+            pass
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# join types as written in SQL which map onto another join type
+JOIN_TYPES = {'join': 'inner', 'full': 'outer'}
+
+
+class HashIndex(object):
+    """hash index over the values of a join key. the values are factorized
+    into integer codes and row positions grouped by code, so every row
+    matching a key can be found without rescanning the values. null keys are
+    left out as they never match"""
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        self.uniques = pd.Index(uniques)
+        self.size = len(codes)
+        self.counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        self.starts = np.cumsum(self.counts) - self.counts
+        # a stable sort keeps rows sharing a code in their original order,
+        # null keys are coded -1 so sort first and get skipped
+        order = np.argsort(codes, kind='mergesort')
+        self.positions = order[self.size - self.counts.sum():]
+
+    def __len__(self):
+        return self.size
+
+    def lookup(self, values):
+        """codes of values within the index, -1 for values not in it"""
+        return self.uniques.get_indexer(values)
+
+    def rows(self, value):
+        """positions of the rows whose key equals value"""
+        code = self.lookup([value])[0]
+        if code < 0:
+            return self.positions[:0]
+        start = self.starts[code]
+        return self.positions[start:start + self.counts[code]]
+
+    def probe(self, values):
+        """positions of every matching pair of rows, as an array of positions
+        into values and an array of positions into the indexed rows"""
+        codes = self.lookup(values)
+        probe = np.flatnonzero(codes >= 0)
+        codes = codes[probe]
+        counts = self.counts[codes]
+        probe = np.repeat(probe, counts)
+        # offset of each pair within the run of rows for its code
+        firsts = np.cumsum(counts) - counts
+        offsets = np.arange(counts.sum()) - np.repeat(firsts, counts)
+        build = self.positions[np.repeat(self.starts[codes], counts) + offsets]
+        return probe, build
+
+
+def _unmatched(size, matched):
+    mask = np.ones(size, dtype=bool)
+    mask[matched] = False
+    return np.flatnonzero(mask)
+
+
+def _take(frame, positions):
+    """rows of frame at positions, with a row of nulls wherever the position
+    is -1"""
+    if (positions < 0).any():
+        frame = frame.reset_index(drop=True).reindex(positions)
+    else:
+        frame = frame.take(positions)
+    frame.index = np.arange(len(positions))
+    return frame
+
+
+def hash_join(left, right, left_on, right_on, how='inner',
+              left_index=None, right_index=None):
+    """join left and right where left[left_on] equals right[right_on]. a hash
+    index is built over the key of the smaller frame and probed with the key
+    of the larger one, unless an index already built over the key of either
+    frame is passed in as left_index or right_index. how is one of inner,
+    left, right or outer. returns the joined frame and which side, left or
+    right, the index was built on"""
+    how = JOIN_TYPES.get(how, how)
+    if how not in ('inner', 'left', 'right', 'outer'):
+        raise ValueError('Unsupported join type: %s' % how)
+
+    if right_index is None and left_index is None:
+        if len(right) <= len(left):
+            right_index = HashIndex(right[right_on].values)
+        else:
+            left_index = HashIndex(left[left_on].values)
+    if right_index is not None:
+        build = 'right'
+        left_pos, right_pos = right_index.probe(left[left_on].values)
+    else:
+        build = 'left'
+        right_pos, left_pos = left_index.probe(right[right_on].values)
+
+    # rows kept by outer joins despite having no match
+    if how in ('left', 'outer'):
+        missing = _unmatched(len(left), left_pos)
+        left_pos = np.concatenate((left_pos, missing))
+        right_pos = np.concatenate((right_pos, -np.ones_like(missing)))
+    if how in ('right', 'outer'):
+        missing = _unmatched(len(right), right_pos[right_pos >= 0])
+        right_pos = np.concatenate((right_pos, missing))
+        left_pos = np.concatenate((left_pos, -np.ones_like(missing)))
+
+    joined = pd.concat([_take(left, left_pos), _take(right, right_pos)],
+                       axis=1)
+    return joined, build
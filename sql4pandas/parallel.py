@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import threading
+import numexpr as ne
+
+# fewest rows worth giving a partition of their own, below which forking a
+# worker costs more than it saves
+MIN_PARTITION = 100000
+
+# the function mapped over partitions and the process forking the workers,
+# set while the workers are forked so they inherit them
+_task = {}
+_lock = threading.Lock()
+
+
+def partitions(size, processes):
+    """slices splitting range(size) into at most processes partitions of at
+    least MIN_PARTITION rows, or a single one when there are too few rows"""
+    count = max(1, min(processes, size // MIN_PARTITION))
+    bounds = [size * i // count for i in xrange(count + 1)]
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def in_worker():
+    """whether this is a worker process forked by map_partitions, which
+    mustn't wait on locks as one held by another thread of the process it was
+    forked from stays held in the worker"""
+    return _task.get('pid', os.getpid()) != os.getpid()
+
+
+def _run_partition(rows):
+    # the workers already have a core each, so numexpr shouldn't start more
+    # threads of its own in every one of them
+    ne.set_num_threads(1)
+    # another thread may have been evaluating an expression when the worker
+    # was forked, leaving the lock numexpr evaluates under held in the worker
+    if hasattr(ne.necompiler, 'evaluate_lock'):
+        ne.necompiler.evaluate_lock = threading.Lock()
+    return _task['fn'](rows)
+
+
+def map_partitions(fn, size, processes):
+    """the results of fn over the slices of each partition of range(size), in
+    order. partitions run in a pool of worker processes forked from this one,
+    so fn and the tables it reads are shared with the workers copy-on-write
+    rather than pickled, only each slice and its result are. runs here when
+    there is a single partition or processes can't be forked"""
+    slices = partitions(size, processes)
+    if len(slices) == 1 or not hasattr(os, 'fork'):
+        return [fn(rows) for rows in slices]
+    with _lock:
+        _task['fn'] = fn
+        _task['pid'] = os.getpid()
+        try:
+            pool = multiprocessing.Pool(len(slices))
+        finally:
+            _task.clear()
+    try:
+        return pool.map(_run_partition, slices, chunksize=1)
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,245 @@
+import re
+from ast import literal_eval
+from aggregate import DECOMPOSABLE
+from join import JOIN_TYPES
+
+# a single comparison as written out by SQLParser.comparison
+_EQUALITY = re.compile(r'^\((\w+) == (.+)\)$')
+
+
+def strings_in(obj):
+    """every string held anywhere within nested dictionaries, lists and
+    tuples of a parsed statement"""
+    if isinstance(obj, basestring):
+        yield obj
+    elif isinstance(obj, dict):
+        for k, v in obj.iteritems():
+            for string in strings_in(k):
+                yield string
+            for string in strings_in(v):
+                yield string
+    elif isinstance(obj, (list, tuple)):
+        for x in obj:
+            for string in strings_in(x):
+                yield string
+
+
+def referenced_names(parsed):
+    """collect every name referenced anywhere in a parsed statement, leaving
+    out its nested queries as they reference tables of their own. returns
+    None when the statement selects every column (SELECT *)"""
+    if parsed.get('SELECT', None) is None:
+        return None
+    names = set()
+    for section, val in parsed.iteritems():
+        if section != 'NESTED_QUERIES':
+            names.update(strings_in(val))
+    return names
+
+
+def prune_columns(columns, identifier, names):
+    """columns of a table which are referenced either qualified as
+    identifier.col or by their bare name. names of None keeps all columns"""
+    if names is None:
+        return list(columns)
+    return [col for col in columns
+            if identifier + '.' + col in names or col in names]
+
+
+def nullable_tables(identifier, joins):
+    """identifiers of the tables whose columns may be filled with nulls by an
+    outer join, in the order joins are applied. filtering one of these before
+    the join would change which rows the join produces"""
+    nullable = set()
+    joined = [identifier]
+    for right, how, left_on, right_on, right_identifier in joins:
+        if how in ('right', 'outer', 'full'):
+            nullable.update(joined)
+        if how in ('left', 'outer', 'full'):
+            nullable.add(right_identifier)
+        joined.append(right_identifier)
+    return nullable
+
+
+def combine_conditions(conds):
+    """AND together a list of (ev_str, identifiers) conditions"""
+    if len(conds) == 0:
+        return None
+    identifiers = {}
+    for ev_str, ids in conds:
+        identifiers.update(ids)
+    if len(conds) == 1:
+        return conds[0][0], identifiers
+    # conjuncts may be ORs, which bind looser than &
+    return ' & '.join('(%s)' % ev_str for ev_str, ids in conds), identifiers
+
+
+def pushdown_predicates(parsed, columns):
+    """split the conjuncts of a WHERE clause by the table they reference so
+    each can be applied to its table before any joins. columns maps each
+    table identifier to its column names. returns a dictionary of table
+    identifier to a list of conditions, along with the condition left over
+    for WHERE"""
+    conjuncts = parsed.get('CONJUNCTS', [])
+    if len(conjuncts) == 0 or 'FROM' not in parsed:
+        return {}, parsed.get('WHERE', None)
+    nullable = nullable_tables(parsed['FROM'][1], parsed.get('JOINS', []))
+
+    def table_of(identifiers):
+        """the single table a condition references, None if the condition
+        references no table columns, several tables or aggregates"""
+        tables = set()
+        for col, fn in identifiers.itervalues():
+            if fn is not None or '.' not in col:
+                return None
+            identifier, name = col.split('.', 1)
+            if name not in columns.get(identifier, ()):
+                return None
+            tables.add(identifier)
+        if len(tables) != 1:
+            return None
+        return tables.pop()
+
+    pushed, residual = {}, []
+    for cond in conjuncts:
+        identifier = table_of(cond[1])
+        if identifier is None or identifier in nullable:
+            residual.append(cond)
+        else:
+            pushed.setdefault(identifier, []).append(cond)
+    return pushed, combine_conditions(residual)
+
+
+def equality(cond, params=None):
+    """the column and value compared by a condition of the form
+    col = literal or col = parameter, the value of a parameter being looked up
+    in params. None for any other condition"""
+    ev_str, identifiers = cond
+    match = _EQUALITY.match(ev_str)
+    if match is None or match.group(1) not in identifiers:
+        return None
+    col, fn = identifiers[match.group(1)]
+    if fn is not None:
+        return None
+    if params is not None and match.group(2) in params:
+        return col, params[match.group(2)]
+    try:
+        return col, literal_eval(match.group(2))
+    except (ValueError, SyntaxError):
+        # compared to another column rather than a literal
+        return None
+
+
+def _single_table(parsed):
+    """whether a statement reads from a single table of the database, without
+    joins or nested queries"""
+    return 'FROM' in parsed and len(parsed.get('JOINS', [])) == 0 \
+        and len(parsed.get('NESTED_QUERIES', {})) == 0
+
+
+def streamable(parsed):
+    """whether a statement can be executed over its table a chunk of rows at
+    a time, each chunk giving its own rows of the result. statements which
+    join, aggregate, sort or select INTO a table need every row at once"""
+    return _single_table(parsed) and 'INTO' not in parsed \
+        and len(parsed.get('FUNCTIONS', {})) == 0 \
+        and parsed.get('GROUP', None) is None \
+        and parsed.get('ORDER', None) is None
+
+
+def aggregable(parsed):
+    """whether the aggregates of a statement can be computed over its table a
+    chunk of rows at a time, combining the partial aggregates of each
+    chunk"""
+    fns = parsed.get('FUNCTIONS', {})
+    return _single_table(parsed) and len(fns) > 0 \
+        and all(fn in DECOMPOSABLE for _fns in fns.itervalues()
+                for fn in _fns)
+
+
+def _base_table(table, nested, catalog):
+    """the table of catalog a statement reads as table, following nested
+    queries down to the table they read from. None if there is none"""
+    while table in nested:
+        query = nested[table]
+        if 'FROM' not in query:
+            return None
+        table, nested = query['FROM'][0], query.get('NESTED_QUERIES', {})
+    return table if table in catalog else None
+
+
+def _keys(join):
+    """((identifier, column), (identifier, column)) of the key already
+    joined and the key of the table a join adds"""
+    right, how, left_on, right_on, right_identifier = join
+    if left_on.split('.', 1)[0] == right_identifier:
+        left_on, right_on = right_on, left_on
+    return tuple(tuple(key.split('.', 1)) if '.' in key else (None, key)
+                 for key in (left_on, right_on))
+
+
+def order_joins(parsed, catalog, distinct):
+    """joins of a statement in the order to apply them. runs of inner joins
+    are reordered greedily, each step applying the join estimated to give
+    the fewest rows of those whose key is of a table already joined. outer
+    joins stay where they are written, as moving a join past one changes
+    the rows it gives. a join is estimated to give the rows of each side
+    over the larger count of distinct keys, the rows of a table being those
+    of catalog and distinct(table, column) the count of distinct values of
+    one of its columns. nested queries are taken to have the rows of the
+    table they read. joins are left in the order written when a table isn't
+    in catalog, or when SELECT * gives their columns in that order"""
+    joins = parsed.get('JOINS', [])
+    if len(joins) < 2 or 'FROM' not in parsed \
+            or parsed.get('SELECT', None) is None:
+        return joins
+    nested = parsed.get('NESTED_QUERIES', {})
+    tables = {}
+    for table, identifier in [parsed['FROM']] + [(j[0], j[-1])
+                                                 for j in joins]:
+        tables[identifier] = _base_table(table, nested, catalog)
+        if tables[identifier] is None:
+            return joins
+
+    def rows(identifier):
+        return len(catalog[tables[identifier]])
+
+    def keys(identifier, col, limit):
+        table = tables.get(identifier)
+        if table is None or col not in catalog[table].columns:
+            return limit
+        return min(distinct(table, col), limit)
+
+    def estimate(size, join):
+        (left, left_col), (right, right_col) = _keys(join)
+        right_rows = rows(join[-1])
+        count = max(keys(left, left_col, size),
+                    keys(right, right_col, right_rows), 1)
+        return size * right_rows / float(count)
+
+    joined = set([parsed['FROM'][1]])
+    size = rows(parsed['FROM'][1])
+    ordered = []
+    pending = list(joins) + [None]
+    run = []
+    for join in pending:
+        if join is not None and JOIN_TYPES.get(join[1], join[1]) == 'inner':
+            run.append(join)
+            continue
+        while len(run) > 0:
+            ready = [j for j in run if _keys(j)[0][0] in joined]
+            if len(ready) == 0:
+                # nothing joins onto the tables so far, keep what's left as
+                # written
+                ready = run[:1]
+            best = min(ready, key=lambda j: estimate(size, j))
+            size = estimate(size, best)
+            run.remove(best)
+            ordered.append(best)
+            joined.add(best[-1])
+        if join is not None:
+            # an outer join keeps at least the rows of the sides it keeps
+            size = max(size, estimate(size, join))
+            ordered.append(join)
+            joined.add(join[-1])
+    return ordered
@@ -0,0 +1,50 @@
+import re
+
+# names bound parameters are compiled to, _param0 for the first ? and
+# _param_name for :name, @name or $name
+_POSITIONAL = re.compile(r'^_param(\d+)$')
+_NAMED = '_param_'
+
+
+def bind(names, args, kwargs):
+    """dictionary of each parameter name a statement references to the value
+    bound to it, positional parameters are taken from args in order and named
+    ones from kwargs"""
+    params = {}
+    positional = 0
+    for name in names:
+        match = _POSITIONAL.match(name)
+        if match is not None:
+            i = int(match.group(1))
+            positional = max(positional, i + 1)
+            if i < len(args):
+                params[name] = args[i]
+        elif name[len(_NAMED):] in kwargs:
+            params[name] = kwargs[name[len(_NAMED):]]
+        else:
+            raise ValueError('No value bound to parameter :%s'
+                             % name[len(_NAMED):])
+    if len(args) != positional:
+        raise ValueError('Statement takes %d parameters, %d were bound'
+                         % (positional, len(args)))
+    return params
+
+
+class PreparedStatement(object):
+    """a statement parsed once by PandasCursor.prepare, which can then be
+    executed any number of times with different parameters. parameters are
+    passed to numexpr as variables alongside the columns, so the statement is
+    never rewritten or parsed again"""
+    def __init__(self, cursor, statement, plan):
+        self.cursor = cursor
+        self.statement = statement
+        self.plan = plan
+
+    @property
+    def params(self):
+        """names of the parameters the statement references"""
+        return self.plan.get('PARAMS', [])
+
+    def execute(self, *args, **kwargs):
+        self.cursor.execute(self, *args, **kwargs)
+        return self.cursor
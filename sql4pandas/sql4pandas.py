@@ -1,26 +1,220 @@
+import imp
+import sys
+import threading
+import time
+import numpy as np
 import pandas as pd
-from sqlparser import SQLParser
+from collections import OrderedDict
+from connection import Connection
+from aggregate import reduce_columns, PartialAggregate
+from case import evaluate_case, literal_value
+from join import hash_join, JOIN_TYPES
+from stats import QueryStats
+from prepared import PreparedStatement, bind
+from batch import varying_conditions, select_rows
+from parallel import map_partitions, in_worker
+from explain import explain_mode, explain, analyze
+from planner import referenced_names, prune_columns, pushdown_predicates, \
+    combine_conditions, equality, streamable, aggregable, order_joins
 
 
 class PandasCursor (object):
-    """takes a dictionary of pandas dataframes as an argument"""
-    def __init__(self, dfs):
-        self.db = dfs
+    """takes a dictionary of pandas dataframes as an argument, or a
+    Connection to share its tables with the other cursors on it. cache_size
+    bounds the number of parsed statements kept for reuse. joins are carried
+    out by a hash join unless join is set to 'merge', which uses
+    DataFrame.merge instead. statements are parsed with sqlparse unless
+    parser is set to 'antlr', which uses the bundled SQLite grammar. given
+    a chunksize, statements which neither join, aggregate nor sort are run
+    over that many rows of their table at a time as their result is
+    fetched, and those which aggregate have their aggregates computed that
+    many rows at a time. given a number of processes, statements over a
+    single table which either aggregate or don't sort are run over
+    partitions of its rows in that many worker processes. chains of inner
+    joins are reordered to keep the rows between joins few, estimated from
+    the rows of the tables and the distinct values of their keys. on_stats is
+    called with the statement and its QueryStats once it has executed.
+    cache_size, join, parser and on_stats are taken from the connection
+    when given one"""
+    def __init__(self, dfs, cache_size=128, join='hash', parser='sqlparse',
+                 chunksize=None, processes=None, on_stats=None):
+        if not isinstance(dfs, Connection):
+            dfs = Connection(dfs, cache_size, join, parser, on_stats)
+        self.connection = dfs
+        # temporary tables of the statement being executed, looked up before
+        # the tables of the connection
+        self._scratch = {}
         self._curr_val = None
+        # rows of _curr_val already fetched, and the chunks of a streamed
+        # result still to be executed
+        self._position = 0
+        self._stream = None
+        # sql of the statement executing, passed to on_stats
+        self._statement = None
+        self.chunksize = chunksize
+        self.processes = processes
+        self.last_stats = None
+
+    # set through the cursor, these change the connection and so every
+    # cursor on it
+    @property
+    def db(self):
+        return self.connection.db
+
+    @db.setter
+    def db(self, dfs):
+        with self.connection._lock:
+            self.connection.db = dfs
+
+    @property
+    def join(self):
+        return self.connection.join
+
+    @join.setter
+    def join(self, join):
+        self.connection.join = join
+
+    @property
+    def parser(self):
+        return self.connection.parser
+
+    @parser.setter
+    def parser(self, parser):
+        self.connection.parser = parser
+
+    @property
+    def plan_cache(self):
+        return self.connection.plan_cache
+
+    def _table(self, name):
+        """table of the statement being executed, either one of its
+        temporary tables or one of the connection"""
+        if name in self._scratch:
+            return self._scratch[name]
+        return self.connection.db[name]
 
     def execute(self, statement, *args, **kwargs):
-
-        def _execute(parsed):
-
-            def id_dict(identifiers):
+        """execute a statement, either sql or a statement returned by
+        prepare. args are bound to its ? parameters in order and kwargs to
+        its :name parameters. a statement preceded by EXPLAIN gives the
+        operators it would run as its result instead, see sql4pandas.explain,
+        and one preceded by EXPLAIN ANALYZE runs and annotates them with
+        the statistics of running them"""
+        mode = None
+        if isinstance(statement, basestring):
+            mode, statement = explain_mode(statement)
+        parsed = self._begin(statement)
+        params = bind(parsed.get('PARAMS', []), args, kwargs)
+        self._position, self._stream = 0, None
+        if mode is not None:
+            self._curr_val = self._explain(parsed, params, mode == 'ANALYZE')
+            return
+        if self.chunksize is not None and self.processes is None \
+                and streamable(parsed):
+            # finished as the last chunk is fetched
+            self._curr_val = None
+            self._stream = self._run(parsed, [params], self.chunksize)
+        else:
+            self._curr_val = self._run(parsed, [params], self.chunksize,
+                                       self.processes)[0]
+            self._finish()
+
+    def executemany(self, statement, seq_of_parameters):
+        """execute a statement once for each set of parameters, each either a
+        sequence bound to its ? parameters or a dictionary bound to its :name
+        parameters. fetchall then returns the results of every set together,
+        keyed on the position of the set in an outer level of the index.
+        when the parameters only appear in WHERE, everything up to WHERE is
+        run once and the rows of each set selected from it in a batch"""
+        parsed = self._begin(statement)
+        names = parsed.get('PARAMS', [])
+        param_sets = [bind(names, (), params) if isinstance(params, dict)
+                      else bind(names, params, {})
+                      for params in seq_of_parameters]
+        results = self._run(parsed, param_sets)
+        self._curr_val, self._position, self._stream = None, 0, None
+        if len(results) > 0 and 'INTO' not in parsed:
+            self._curr_val = pd.concat(results, keys=range(len(results)))
+        self._finish()
+
+    def _explain(self, parsed, params, run):
+        """frame of the operators of a statement, annotated with the
+        statistics of executing it when run is set"""
+        plan = explain(parsed, self.connection.db, self.join,
+                       self.connection.indexes, self.chunksize, self.processes,
+                       self.connection.distinct)
+        if not run:
+            return plan
+        result = self._run(parsed, [params], self.chunksize, self.processes)
+        if not isinstance(result, list):
+            # a streamed result runs as its chunks are consumed
+            for chunk in result:
+                pass
+        self._finish()
+        return analyze(plan, self.last_stats)
+
+    def _begin(self, statement):
+        """plan of a statement about to be executed, starting the
+        statistics of its execution with the time taken to plan it"""
+        self._statement = getattr(statement, 'statement', statement)
+        self.last_stats = QueryStats()
+        start = time.time()
+        parsed = self._plan(statement)
+        self.last_stats.record('PARSE', time.time() - start, 0, 0, 0)
+        return parsed
+
+    def _finish(self):
+        """pass the statistics of the statement just executed on to
+        on_stats"""
+        if self.connection.on_stats is not None:
+            self.connection.on_stats(self._statement, self.last_stats)
+
+    def _run(self, parsed, param_sets, chunksize=None, processes=None):
+        """execute a parsed statement for each set of parameters in turn,
+        returning the result of each. given a chunksize, a streamable
+        statement is instead executed over that many rows of its FROM table
+        at a time and a generator of the result of each chunk returned,
+        while one that aggregates has its aggregates combined from those of
+        each chunk. given processes, statements over a single table are
+        executed over partitions of its rows in that many worker
+        processes. the statistics of executing it are added to
+        self.last_stats"""
+
+        def _recorded(fn):
+            """fn over a partition of rows or a nested query, returning its
+            result along with the statistics of executing it apart from
+            self.last_stats, which a worker process can't add to itself"""
+            def run(part):
+                outer, self.last_stats = self.last_stats, QueryStats()
+                try:
+                    return fn(part), self.last_stats
+                finally:
+                    self.last_stats = outer
+            return run
+
+        def _chunks(parsed):
+            size = len(self._table(parsed['FROM'][0]))
+            # an empty table still gives an empty result
+            for start in xrange(0, max(size, 1), chunksize):
+                for result in _execute(parsed,
+                                       chunk=slice(start, start + chunksize)):
+                    yield result
+
+        def _execute(parsed, batch=None, chunk=None, parts=False):
+
+            def id_dict(identifiers, frame=None):
                 """translate dictionary of string identifiers used into
                 usable dictionary to pass to numexpr"""
-                _dict = {}
+                _dict = dict(params)
+                if frame is None:
+                    _dict.update((idx, _get_val(col, fn))
+                                 for idx, (col, fn) in identifiers.iteritems())
+                    return _dict
                 for idx, (col, fn) in identifiers.iteritems():
                     if fn is None:
-                        _dict[idx] = self._curr_val[col]
+                        _dict[idx] = frame[col]
                     else:
-                        _dict[idx] = self._curr_val[col][fn]
+                        _dict[idx] = frame[col][fn]
                 return _dict
 
             def _single_identifier(identifier):
@@ -38,45 +232,66 @@ class PandasCursor (object):
 
             def _alias(alias, col, fn):
                 if col is None:
-                    self._curr_val[alias] = \
+                    computed[alias] = \
                         self._curr_val[_single_identifier(alias)]
-                elif fn is None:
-                    self._curr_val[alias] = self._curr_val[col]
+                elif fn is None and col not in computed \
+                        and col not in self._curr_val:
+                    # alias of a column name which isn't qualified
+                    computed[alias] = self._curr_val[_single_identifier(col)]
                 else:
-                    self._curr_val[alias] = self._curr_val[col][fn]
+                    computed[alias] = _get_val(col, fn)
 
             def _get_val(col, fn):
+                if fn is None and col in computed:
+                    return computed[col]
+                if fn is None and col in params:
+                    return params[col]
                 if fn is not None:
                     return self._curr_val[col][fn]
+                elif isinstance(self._curr_val.columns, pd.MultiIndex) \
+                        and (col, '') in self._curr_val.columns:
+                    # a column grouped on, which may be aggregated as well
+                    return self._curr_val[(col, '')]
                 else:
                     return self._curr_val[col]
 
+            def _materialize():
+                """insert computed columns into the frame ahead of a section
+                which changes its rows, literals stay scalars as they hold
+                for any row"""
+                for name, val in computed.items():
+                    if np.ndim(val) > 0:
+                        self._curr_val[name] = val
+                        del computed[name]
+
             def _operation(op):
                 as_name, expr = op['as_name'], op['expr']
                 ev_str, identifiers = expr
-                col = pd.eval(ev_str, local_dict=id_dict(identifiers))
-                self._curr_val[as_name] = col
+                computed[as_name] = \
+                    pd.eval(ev_str, local_dict=id_dict(identifiers))
+
+            def _case_val(col, fn):
+                """THEN or ELSE result, literals are taken as their value"""
+                if fn is None and col in literals:
+                    return literal_value(literals[col])
+                return _get_val(col, fn)
 
             def _case(case):
                 as_name, else_stmt, stmts = \
                     case['as_name'], case.get('else_stmt', None), case['stmts']
-
-                # make a copy of a column in the data frame and use it as a base
-                col = self._curr_val.iloc[:, 0].copy()
-                if else_stmt is not None:
-                    else_val = _get_val(*else_stmt)
-                    col.loc[:] = else_val
-                else:
-                    # default to NULL as no else val specified
-                    col.loc[:] = None
-
-                for (ev_str, identifiers), stmt in stmts:
-                    print ev_str
-                    idx = pd.eval(ev_str, local_dict=id_dict(identifiers))
-                    val = _get_val(*stmt)
-                    col[idx] = val[idx]
-
-                self._curr_val[as_name] = col
+                # stmts are listed last WHEN first
+                stmts = stmts[::-1]
+                conditions, values, identifiers = [], [], {}
+                for (ev_str, ids), stmt in stmts:
+                    conditions.append(ev_str)
+                    values.append(_case_val(*stmt))
+                    identifiers.update(ids)
+                local_dict = id_dict(identifiers)
+                computed[as_name] = evaluate_case(
+                    conditions, values,
+                    None if else_stmt is None else _case_val(*else_stmt),
+                    local_dict,
+                    lambda ev_str: pd.eval(ev_str, local_dict=local_dict))
 
             def _select(identifiers):
                 if identifiers is None or len(identifiers) == 0:
@@ -84,38 +299,122 @@ class PandasCursor (object):
                 # first setup any aliases
                 [_alias(alias, *val) for alias, val in aliases.iteritems()]
 
-                ids = []
+                # assemble the selected columns into a frame in one go
+                ids, columns = [], OrderedDict()
                 for col, fn in identifiers:
-                    if fn is None:
-                        idx = col
-                    else:
-                        idx = col+'_'+fn
-                        self._curr_val[idx] = self._curr_val[col][fn]
+                    idx = col if fn is None else col+'_'+fn
+                    val = _get_val(col, fn)
+                    columns[idx] = getattr(val, 'values', val)
                     ids.append(idx)
-                self._curr_val = self._curr_val[ids]
+                self._curr_val = pd.DataFrame(columns, columns=ids,
+                                              index=self._curr_val.index)
+
+            def _qualified(table, identifier, rows=None):
+                """resolve the columns of a table as identifier.col without
+                copying it, the frame returned shares its data with the
+                table in the catalog so nothing may be modified in place.
+                rows selects the positions of the table's rows to resolve"""
+                tbl = self._table(table)
+                if rows is not None:
+                    tbl = tbl.iloc[rows]
+                cols = prune_columns(tbl.columns, identifier, referenced)
+                if len(cols) < len(tbl.columns):
+                    # only load the columns referenced by the statement
+                    tbl = tbl[cols]
+                names = dict((col, identifier + '.' + col) for col in cols)
+                return tbl.rename(columns=names, copy=False)
+
+            def _scan(table, identifier, rows=None):
+                """qualified table with any WHERE conditions pushed down to
+                it already applied, limited to the slice rows of the table
+                when given"""
+                conds = pushed.get(identifier, [])
+                for i, cond in enumerate(conds):
+                    # an equality on an indexed column is looked up in the
+                    # index rather than compared against every row
+                    lookup = equality(cond, params)
+                    index = lookup and _key_index(table, identifier, lookup[0])
+                    if index is not None:
+                        found = index.rows(lookup[1])
+                        if rows is not None:
+                            found = found[(found >= rows.start) &
+                                          (found < rows.stop)]
+                        rows = found
+                        conds = conds[:i] + conds[i+1:]
+                        break
+                tbl = _qualified(table, identifier, rows)
+                cond = combine_conditions(conds)
+                if cond is not None:
+                    ev_str, identifiers = cond
+                    tbl = tbl[pd.eval(ev_str,
+                                      local_dict=id_dict(identifiers, tbl))]
+                return tbl
+
+            def _key_index(table, identifier, col):
+                """index declared on the column of a table referenced as
+                identifier.col, None if there is none. worker processes only
+                use the indexes resolved before they were forked"""
+                if not col.startswith(identifier + '.') \
+                        or table in self._scratch:
+                    return None
+                key = table, col[len(identifier) + 1:]
+                if in_worker():
+                    frame, index = resolved.get(key, (None, None))
+                    return index if frame is self._table(table) else None
+                return self.connection.index(*key)
 
             def _from(tbl):
                 table, identifier = tbl
-                self._curr_val = self.db[table].copy()
-                # add identifier for table to column names
-                self._curr_val.columns = \
-                    [identifier + '.' + col for col in self._curr_val.columns]
-                if len(joins) > 0:
-                    [_join(*j) for j in joins]
-                # setup literal columns specified in select statement
-                for identifier, value in literals.iteritems():
-                    self._curr_val[identifier] = value
+                rows = len(self._table(table))
+                if chunk is not None:
+                    rows = len(xrange(*chunk.indices(rows)))
+
+                def scan():
+                    self._curr_val = _scan(table, identifier, chunk)
+                self._curr_val = None
+                _timed('FROM', scan, rows_in=rows)
+                # while nothing has been joined or filtered the rows are
+                # those of the table, so its indexes can serve the first join
+                scanned[:] = [] if identifier in pushed else [tbl]
+                for j in joins:
+                    _timed('JOIN', _join, j)
+                # literal columns specified in select statement are kept as
+                # scalars until the final frame is assembled
+                computed.update(literals)
 
             def _join(right, how, left_on, right_on, right_identifier):
-                right = self.db[right].copy()
+                start = time.time()
+                table, right = right, _scan(right, right_identifier)
                 # need to make interchangable
                 if left_on not in self._curr_val.columns:
                     right_on, left_on = left_on, right_on
-                right.columns = \
-                    [right_identifier + '.' + col for col in right.columns]
-                self._curr_val = \
-                    self._curr_val.merge(right, how=how, left_on=left_on,
-                                         right_on=right_on)
+                how = JOIN_TYPES.get(how, how)
+                stats = {'table': table, 'identifier': right_identifier,
+                         'how': how, 'strategy': self.join,
+                         'left_rows': len(self._curr_val),
+                         'right_rows': len(right)}
+                if self.join == 'merge':
+                    self._curr_val = \
+                        self._curr_val.merge(right, how=how, left_on=left_on,
+                                             right_on=right_on)
+                else:
+                    # reuse indexes declared on either key column, as long
+                    # as the rows on that side are still those of its table
+                    right_index = left_index = None
+                    if right_identifier not in pushed:
+                        right_index = _key_index(table, right_identifier,
+                                                 right_on)
+                    if len(scanned) > 0:
+                        left_index = _key_index(scanned[0][0], scanned[0][1],
+                                                left_on)
+                    self._curr_val, stats['build'] = \
+                        hash_join(self._curr_val, right, left_on, right_on, how,
+                                  left_index, right_index)
+                    stats['index'] = (right_index or left_index) is not None
+                scanned[:] = []
+                stats['rows'] = len(self._curr_val)
+                stats['seconds'] = time.time() - start
+                self.last_stats.joins.append(stats)
 
             def _where(cond):
                 ev_str, identifiers = cond
@@ -134,12 +433,10 @@ class PandasCursor (object):
                         for k, v in funs.iteritems()}
 
                 if groupby is None:
-                    # create a fake column which holds only one value, so
-                    # group will aggregate entire columns into one group
-                    fake_column = '####fake'
-                    self._curr_val[fake_column] = 0
-                    groupby = self._curr_val.groupby(fake_column)
-                self._curr_val = groupby.agg(funs).reset_index()
+                    # not grouping, so reduce entire columns into one row
+                    self._curr_val = reduce_columns(self._curr_val, funs)
+                else:
+                    self._curr_val = groupby.agg(funs).reset_index()
 
             def _group(group_by):
                 groupby = self._curr_val.groupby(group_by)
@@ -147,7 +444,51 @@ class PandasCursor (object):
                     _apply_functions(fns, groupby)
 
             def _order(identifiers):
-                self._curr_val.sort(identifiers, inplace=True)
+                # sort_values replaced sort in pandas 0.17. sorting in place
+                # checks the frame isn't a copy of another, which runs a full
+                # garbage collection
+                sort = getattr(self._curr_val, 'sort_values',
+                               self._curr_val.sort)
+                self._curr_val = sort(identifiers,
+                                      ascending=parsed.get('ASCENDING', True))
+
+            def _nested(queries):
+                """results of the nested queries in FROM and JOIN, which are
+                independent of each other so several are run concurrently
+                on threads, each with a cursor of its own. they are run one
+                after another while a module is being imported, as the
+                threads would wait on the import lock held by this one"""
+                done = [None] * len(queries)
+
+                def run(i, query):
+                    cursor = self.connection.cursor()
+                    cursor.last_stats = QueryStats()
+                    try:
+                        done[i] = cursor._run(query, [params])[0], \
+                            cursor.last_stats
+                    except Exception:
+                        done[i] = sys.exc_info()
+
+                if len(queries) < 2 or imp.lock_held():
+                    done = [_recorded(_execute)(query)
+                            for query in queries.itervalues()]
+                    done = [(results[0], stats) for results, stats in done]
+                else:
+                    # plain threads, as closing a ThreadPool waits on the
+                    # tenth of a second its handler thread sleeps for
+                    threads = [threading.Thread(target=run, args=(i, query))
+                               for i, query in enumerate(queries.values())]
+                    [thread.start() for thread in threads]
+                    [thread.join() for thread in threads]
+                    for outcome in done:
+                        if len(outcome) == 3:
+                            raise outcome[0], outcome[1], outcome[2]
+                results = {}
+                for ident, (result, stats) in zip(queries.keys(), done):
+                    self.last_stats.merge(stats)
+                    self.last_stats.nested[ident] = stats
+                    results[ident] = result
+                return results
 
             sections = {'SELECT': _select, 'FROM': _from,
                         'WHERE': _where, 'GROUP': _group,
@@ -160,11 +501,10 @@ class PandasCursor (object):
 
             for k, v in parsed.iteritems():
                 if k == 'NESTED_QUERIES':
-                    for ident, query in v.iteritems():
-                        _execute(query)
-                        self.db[ident] = self.fetchall()
-                        self.db[ident].columns = \
-                            [col.split('.')[1] for col in self.db[ident].columns]
+                    for ident, result in _nested(v).iteritems():
+                        result.columns = \
+                            [col.split('.')[1] for col in result.columns]
+                        self._scratch[ident] = result
                         temp_tables.append(ident)
                 elif k in sections.keys():
                     _exec[k] = sections[k], v
@@ -172,42 +512,342 @@ class PandasCursor (object):
             fns, joins, aliases, cases, ops = \
                 [parsed.get(x, [] if x == 'JOINS' else {})
                  for x in 'FUNCTIONS', 'JOINS', 'ALIASES', 'CASES', 'OPS']
+            joins = order_joins(parsed, self.connection.db,
+                                self.connection.distinct)
             literals = parsed.get('LITERALS', {})
+            referenced = referenced_names(parsed)
+            # the table in FROM while its rows are still unfiltered
+            scanned = []
+            # columns computed by the statement, either scalars or arrays
+            # aligned with the rows of self._curr_val, held apart from the
+            # frame until SELECT
+            computed = {}
+
+            # apply WHERE conditions which only reference a single table to
+            # that table before it is joined, the rest are left for WHERE
+            tables = [parsed['FROM']] if 'FROM' in parsed else []
+            tables += [(j[0], j[-1]) for j in joins]
+            pushed, residual = pushdown_predicates(
+                parsed, dict((identifier, self._table(table).columns)
+                             for table, identifier in tables))
+            if residual is None:
+                _exec.pop('WHERE', None)
+            elif 'WHERE' in _exec:
+                _exec['WHERE'] = _where, residual
+
+            def _sections(keywords):
+                for keyword in keywords:
+                    _section(keyword)
+
+            def _section(keyword):
+                _compute(keyword)
+                fn, args = _exec.get(keyword, (None, None))
+                if fn is None and keyword == 'GROUP' and len(fns) > 0:
+                    # we need to do any aggregating at this point in the query,
+                    # even if not grouping
+                    fn, args = _apply_functions, fns
+                if fn is None:
+                    return
 
-            # execute statement in proper SQL order. ORDER is set before SELECT
-            # for our use case as we may need to sort by a column before it is
-            # filtered out in SELECT statement
-            for keyword in 'FROM', 'WHERE', 'GROUP', 'ORDER', 'SELECT':
+                def run():
+                    if keyword != 'SELECT' and len(computed) > 0:
+                        _materialize()
+                    fn(args)
+                if keyword == 'FROM':
+                    # the scan and each join are recorded apart
+                    run()
+                else:
+                    _timed(keyword, run)
+
+            def _compute(keyword):
+                """operations and case statements evaluated at keyword"""
                 _ops = ops.get(keyword, [])
                 if len(_ops) > 0:
                     # setup any operations at the correct part of evaluation
-                    [_operation(op) for op in _ops]
+                    _timed('OPS', lambda: [_operation(op) for op in _ops])
                 _cases = cases.get(keyword, [])
                 if len(_cases) > 0:
                     # setup any case statements at the correct part of evaluation
-                    [_case(case) for case in _cases]
-                fn, args = _exec.get(keyword, (None, None))
-                if fn is not None:
-                    fn(args)
-                elif keyword == 'GROUP' and len(fns) > 0:
-                    # we need to do any aggregating at this point in the query,
-                    # even if not grouping
-                    _apply_functions(fns)
+                    _timed('CASE', lambda: [_case(case) for case in _cases])
+
+            def _held():
+                """rows of the intermediate result and the bytes held by it
+                and the columns computed alongside it"""
+                rows, size = 0, 0
+                if self._curr_val is not None:
+                    # what memory_usage adds up, without building a Series
+                    rows = len(self._curr_val)
+                    size = self._curr_val.index.nbytes + rows * sum(
+                        dtype.itemsize for dtype in self._curr_val.dtypes.values)
+                size += sum(getattr(val, 'nbytes', 0)
+                            for val in computed.itervalues())
+                return rows, size
+
+            def _timed(stage, fn, args=(), rows_in=None):
+                """run fn(*args) as a stage of the statement, recording the
+                time it takes, the rows going in and out and the growth in
+                memory held by the intermediate result"""
+                rows, size = _held()
+                start = time.time()
+                fn(*args)
+                seconds = time.time() - start
+                rows_out, after = _held()
+                self.last_stats.record(stage, seconds,
+                                       rows if rows_in is None else rows_in,
+                                       rows_out, after - size)
+
+            def _aggregate_parts():
+                """FROM, WHERE and the aggregates of GROUP BY run over
+                partitions of the table's rows, in worker processes when
+                there are several, with the partial aggregates of each
+                combined"""
+                size = len(self._table(parsed['FROM'][0]))
+                _resolve(parsed)
+                parts = map_partitions(_recorded(_aggregate), size,
+                                       processes or 1)
+                for part, stats in parts:
+                    self.last_stats.merge(stats)
+
+                def combine():
+                    partial = parts[0][0]
+                    for part, stats in parts[1:]:
+                        partial.combine(part)
+                    self._curr_val = partial.result()
+                self._curr_val = None
+                _timed('GROUP', combine)
+
+            def _aggregate(rows):
+                """partial aggregates of the slice rows of the table, taken
+                chunksize rows at a time, only the partial aggregates of each
+                group being kept between chunks"""
+                table, identifier = parsed['FROM']
+                partial = PartialAggregate(fns, parsed.get('GROUP', None))
+                step = chunksize or max(rows.stop - rows.start, 1)
+                for start in xrange(rows.start, max(rows.stop, rows.start + 1),
+                                    step):
+                    stop = min(start + step, rows.stop)
+
+                    def scan():
+                        self._curr_val = _scan(table, identifier,
+                                               slice(start, stop))
+                    self._curr_val = None
+                    computed.clear()
+                    _timed('FROM', scan, rows_in=stop - start)
+                    computed.update(literals)
+                    _section('WHERE')
+                    _compute('GROUP')
+
+                    def update():
+                        _materialize()
+                        partial.update(self._curr_val)
+                        # only the partial aggregates are kept
+                        self._curr_val = None
+                    _timed('GROUP', update)
+                return partial
+
+            def _batch(param_sets):
+                """run the rest of the statement for each set of parameters
+                over the rows selected from those shared by every set"""
+                # arrays computed so far have to be selected from with the
+                # rows
+                _materialize()
+                frame, shared = self._curr_val, dict(computed)
+
+                def evaluate(cond, rows, values):
+                    ev_str, identifiers = cond
+                    local_dict = id_dict(identifiers, rows)
+                    local_dict.update(values)
+                    return pd.eval(ev_str, local_dict=local_dict)
+
+                results = []
+                for values, positions in zip(param_sets, select_rows(
+                        frame, parsed['VARYING'], names, param_sets,
+                        evaluate)):
+                    params.clear()
+                    params.update(values)
+                    computed.clear()
+                    computed.update(shared)
+                    self._curr_val = frame.take(positions)
+                    _sections(('GROUP', 'ORDER', 'SELECT'))
+                    results.append(self._curr_val)
+                return results
+
+            # execute statement in proper SQL order. ORDER is set before SELECT
+            # for our use case as we may need to sort by a column before it is
+            # filtered out in SELECT statement
+            keywords = 'FROM', 'WHERE', 'GROUP', 'ORDER', 'SELECT'
+            if parts:
+                _aggregate_parts()
+                _sections(keywords[3:])
+            elif batch is None:
+                _sections(keywords)
+            else:
+                _sections(keywords[:2])
+                results = _batch(batch)
 
             into = parsed.get('INTO', None)
             if into is not None:
-                self.db[into] = self._curr_val
+                self.connection.replace(into, self._curr_val)
                 self._curr_val = None
 
             # clearout any temporary tables before next statement is executed
             for x in temp_tables:
-                del self.db[x]
-
-        parser = SQLParser()
-        _execute(parser.parse_statement(statement))
+                del self._scratch[x]
+            if batch is None:
+                results = [self._curr_val]
+            return results
+
+        def _resolve(parsed):
+            """look up the indexes the scan of a statement's table can use
+            ahead of forking worker processes to run it, as a worker can't
+            take the lock of the connection, which another thread may have
+            held when it was forked"""
+            table, identifier = parsed['FROM']
+            if table in self._scratch:
+                return
+            pushed, residual = pushdown_predicates(
+                parsed, {identifier: self._table(table).columns})
+            for cond in pushed.get(identifier, []):
+                lookup = equality(cond, params)
+                if lookup is not None \
+                        and lookup[0].startswith(identifier + '.'):
+                    column = lookup[0][len(identifier) + 1:]
+                    resolved[(table, column)] = self._table(table), \
+                        self.connection.index(table, column)
+
+        # parameters of the set being executed, which nested queries share
+        params = {}
+        # indexes resolved for worker processes, keyed on (table, column)
+        # along with the table each was looked up for
+        resolved = {}
+        names = parsed.get('PARAMS', [])
+        if chunksize is not None and processes is None \
+                and streamable(parsed):
+            params.update(param_sets[0])
+            return _chunks(parsed)
+        if processes is not None and streamable(parsed):
+            # each worker selects the rows of its own partition
+            params.update(param_sets[0])
+            _resolve(parsed)
+            size = len(self._table(parsed['FROM'][0]))
+            parts = map_partitions(
+                _recorded(lambda rows: _execute(parsed, chunk=rows)[0]), size,
+                processes)
+            for part, stats in parts:
+                self.last_stats.merge(stats)
+            return [pd.concat([part for part, stats in parts])]
+        # aggregates are computed in parts given either a chunksize or
+        # processes to compute them in
+        parts = (chunksize is not None or processes is not None) \
+            and aggregable(parsed)
+        split = None
+        if len(param_sets) > 1:
+            split = varying_conditions(parsed, names)
+        if split is None:
+            results = []
+            for values in param_sets:
+                params.clear()
+                params.update(values)
+                results.extend(_execute(parsed, parts=parts))
+            return results
+        fixed, varying = split
+        # the statement up to WHERE is shared by every set of parameters,
+        # with the conditions varying with them applied to its rows after
+        shared = dict(parsed, CONJUNCTS=fixed, WHERE=combine_conditions(fixed),
+                      VARYING=varying)
+        return _execute(shared, param_sets)
+
+    def _plan(self, statement):
+        """plan of a statement, either sql or a prepared statement"""
+        if isinstance(statement, PreparedStatement):
+            return statement.plan
+        return self.connection.plan(statement)
+
+    def prepare(self, statement):
+        """parse a statement once for repeated execution with different
+        parameters, written as ? or :name where a literal could be"""
+        return PreparedStatement(self, statement,
+                                 self.connection.plan(statement))
+
+    def create_index(self, table, column):
+        """declare a hash index on a column of a table of the connection,
+        see Connection.create_index"""
+        self.connection.create_index(table, column)
+
+    def drop_index(self, table, column):
+        self.connection.drop_index(table, column)
+
+    def cache_info(self):
+        """hits, misses, current size and maxsize of the plan cache"""
+        return self.connection.cache_info()
 
     def fetchall(self):
-        return self._curr_val
+        """every row of the result not yet fetched by fetchone, fetchmany or
+        iterating over the cursor"""
+        self._fill()
+        if self._position == 0:
+            return self._curr_val
+        return self._curr_val.iloc[self._position:]
+
+    def fetchmany(self, size=None):
+        """the next size rows of the result as a frame, chunksize rows or a
+        single row when size isn't given. empty once every row is fetched"""
+        if size is None:
+            size = self.chunksize or 1
+        self._fill(size)
+        if self._curr_val is None:
+            raise ValueError('No result to fetch, the statement selected '
+                             'INTO a table')
+        rows = self._curr_val.iloc[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchone(self):
+        """the next row of the result as a tuple, None once every row is
+        fetched"""
+        rows = self.fetchmany(1)
+        if len(rows) == 0:
+            return None
+        # column by column, as .values would cast the row to a single dtype
+        return next(rows.itertuples(index=False, name=None))
+
+    def __iter__(self):
+        """the rows of the result not yet fetched, as frames of chunksize
+        rows or a single frame when chunksize isn't set"""
+        size = self.chunksize
+        while True:
+            if size is None:
+                self._fill()
+                size = 0 if self._curr_val is None \
+                    else len(self._curr_val) - self._position
+            rows = self.fetchmany(size)
+            if len(rows) == 0:
+                return
+            yield rows
+
+    def _fill(self, size=None):
+        """execute chunks of a streamed result until at least size rows are
+        waiting to be fetched, or every chunk when size is None"""
+        if self._stream is None:
+            return
+        frames = []
+        if self._curr_val is not None:
+            frames.append(self._curr_val.iloc[self._position:])
+        waiting = sum(len(frame) for frame in frames)
+        if size is not None and waiting >= size:
+            return
+        # executing a chunk overwrites _curr_val, so the rows waiting are
+        # held in frames
+        for chunk in self._stream:
+            frames.append(chunk)
+            waiting += len(chunk)
+            if size is not None and waiting >= size:
+                break
+        else:
+            self._stream = None
+            self._finish()
+        self._curr_val = frames[0] if len(frames) == 1 else pd.concat(frames)
+        self._position = 0
 
     def fetch_dicts(self):
         """convenience function to fetch objects as a list of dictionaries,
@@ -1,5 +1,33 @@
+import re
 from sqlparse import parse, tokens
 
+# string literals within a compiled expression
+_QUOTED = re.compile(r"""(?:'(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+
+def parenthesize(ev_str):
+    """wrap an expression in parenthesis unless it is wrapped already"""
+    depth = 0
+    unquoted = _QUOTED.sub('', ev_str)
+    for i, char in enumerate(unquoted):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if depth == 0 and i < len(unquoted) - 1:
+            return '(' + ev_str + ')'
+    return ev_str
+
+
+def parameter(text, position):
+    """name a bound parameter is compiled to in an expression, from its text
+    and, for a bare ?, its position among the other bare ?s"""
+    if text == '?':
+        return '_param%d' % position
+    if text[0] == '?':
+        return '_param%d' % (int(text[1:]) - 1)
+    return '_param_' + text[1:]
+
 
 class SQLParser(object):
     """class used to parse sql statements into a data structure
@@ -19,6 +47,7 @@ class SQLParser(object):
             self.case_num = 0
             nested_queries = {}
             literals = {}
+            conjuncts = []
 
             # some helpers for determining a token's attributes when it isn't
             # completely straight forward
@@ -39,6 +68,23 @@ class SQLParser(object):
                         and token._get_repr_name() != 'Comment'
                         and token.ttype != tokens.Token.Punctuation]
 
+            def ungroup(tkns):
+                """sqlparse groups an operator followed by a ? into the
+                identifier before it, and a ? followed by AS and an alias into
+                an identifier of its own. splice their tokens back in among
+                the tokens around them"""
+                spliced = []
+                for token in tkns:
+                    inner = strip_tkns(token.tokens) \
+                        if is_identifier(token) else []
+                    if len(inner) > 1 and (
+                            inner[-1].ttype in tokens.Operator or
+                            inner[0].ttype in tokens.Name.Placeholder):
+                        spliced.extend(ungroup(inner))
+                    else:
+                        spliced.append(token)
+                return spliced
+
             def get_fns(tkns):
                 """get a dictionary of all functions in statement, needed for
                 order of operations with grouping and case statements"""
@@ -53,13 +99,15 @@ class SQLParser(object):
                         get_fns(tkn.tokens)
 
             def col_identifier(token):
+                if token.ttype in tokens.Name.Placeholder:
+                    return operation([token])
                 if token.ttype in tokens.Literal:
                     literals[token.value] = token.value
                     return token.value, None
                 tkns = token.tokens
 
                 # strip whitespace and punctuation
-                tkns = strip_tkns(tkns)
+                tkns = ungroup(strip_tkns(tkns))
                 if len(tkns) == 1:
                     identifier = tkns[0].value
                     if tkns[0].ttype in tokens.Literal:
@@ -86,6 +134,8 @@ class SQLParser(object):
                     if tkns[0].ttype in tokens.Literal:
                         literals[as_name] = tkns[0].value
                         return as_name, None
+                    elif tkns[0].ttype in tokens.Name.Placeholder:
+                        return operation(tkns, as_name)
                     elif is_case(tkns[0]):
                         return parse_case(tkns[0].tokens, as_name=as_name)
                     elif is_identifier(tkns[0]):
@@ -145,57 +195,116 @@ class SQLParser(object):
 
                 return proc
 
+            def operand(tkns, identifiers):
+                """compile a single operand of an expression, adding any
+                columns or functions it references to identifiers"""
+                def column(col, fn=None):
+                    name = (col if fn is None else col+'_'+fn).replace('.', '_')
+                    identifiers[name] = col, fn
+                    return name
+
+                if len(tkns) > 1:
+                    # the parser doesn't always group table.column
+                    return column(''.join([t.value for t in tkns]))
+                token = tkns[0]
+                if token._get_repr_name() == 'Parenthesis':
+                    # keep parenthesis in the expression so numexpr evaluates
+                    # them, rather than evaluating each one separately
+                    return parenthesize(expression(token.tokens[1:-1],
+                                                   identifiers))
+                if is_comparison(token):
+                    return expression(token.tokens, identifiers)
+                if is_function(token):
+                    return column(*sql_function(token))
+                if token.ttype in tokens.Name.Placeholder:
+                    name = parameter(token.value,
+                                     self.positions.get(id(token)))
+                    self.params.add(name)
+                    return name
+                if token.ttype in tokens.Literal:
+                    return token.value
+                if token.ttype in tokens.Name:
+                    return column(token.value)
+                if token.is_group():
+                    tkns = strip_tkns(token.tokens)
+                    if any(is_operator(t) or t.is_group() for t in tkns):
+                        return parenthesize(expression(tkns, identifiers))
+                    return column(col_identifier(token)[0])
+                return token.value
+
+            def arithmetic(tkns, identifiers):
+                """compile operands joined by arithmetic operators"""
+                parts, _operand = [], []
+                for token in ungroup(tkns):
+                    if is_operator(token):
+                        if len(_operand) > 0:
+                            parts.append(operand(_operand, identifiers))
+                        parts.append(token.value)
+                        _operand = []
+                    else:
+                        _operand.append(token)
+                if len(_operand) > 0:
+                    parts.append(operand(_operand, identifiers))
+                return ' '.join(parts)
+
+            def compare(tkns, identifiers):
+                """compile arithmetic expressions joined by a comparison,
+                comparisons are parenthesized as & and | bind more tightly
+                than comparisons in numexpr"""
+                comp_map = {
+                    '=': '==',
+                    '<>': '!=',
+                }
+                sides, comps, side = [], [], []
+                for token in tkns:
+                    if token.ttype in tokens.Operator.Comparison:
+                        sides.append(side)
+                        comps.append(comp_map.get(token.value, token.value))
+                        side = []
+                    else:
+                        side.append(token)
+                sides.append(side)
+                ev_str = arithmetic(sides[0], identifiers)
+                if len(comps) == 0:
+                    return ev_str
+                for comp, side in zip(comps, sides[1:]):
+                    ev_str += ' ' + comp + ' ' + arithmetic(side, identifiers)
+                return parenthesize(ev_str)
+
+            def expression(tkns, identifiers):
+                """compile a whole expression of comparisons joined by AND,
+                OR and NOT, or plain arithmetic, into one string for numexpr
+                to evaluate in a single pass"""
+                bool_ops = {'AND': '&', 'OR': '|', 'NOT': '~'}
+                ev_str, part = '', []
+                for token in strip_tkns(tkns) + [None]:
+                    if token is not None and not (
+                            token.ttype in tokens.Keyword
+                            and token.value.upper() in bool_ops):
+                        part.append(token)
+                        continue
+                    if len(part) > 0:
+                        ev_str += compare(part, identifiers)
+                        part = []
+                    if token is not None:
+                        op = bool_ops[token.value.upper()]
+                        ev_str += op if op == '~' else ' ' + op + ' '
+                return ev_str
+
             def operation(tkns, as_name=None):
                 """perform arithmetic operations"""
                 # identifiers used in comparision, needed to work around issue
                 # #83 of numexpr
                 identifiers = {}
 
-                if len(tkns) == 1:
+                if len(tkns) == 1 and \
+                        tkns[0].ttype not in tokens.Name.Placeholder:
                     return col_identifier(tkns[0])
-                # get indicies in tkns where operators are
-                op_indices = [i for i, t in enumerate(tkns)
-                              if is_operator(t)]
-                # get operators
-                operators = [t.value for t in tkns
-                             if is_operator(t)]
-                # group other tokens around operators
-                ids = [tkns[:op_indices[0]]]
-                ids += [tkns[i1+1:i2] for i1, i2
-                        in zip(op_indices[:-1], op_indices[1:])]
-                ids += [tkns[op_indices[-1]+1:]]
-
-                def get_id(_id):
-                    if len(_id) > 1:
-                        return ''.join([t.value for t in _id]), None
-                    token = _id[0]
-                    if token._get_repr_name() == 'Parenthesis':
-                        # TODO: instead of just leveraging parsing,
-                        # pass parenthesis into numexpr for performance
-                        # gains
-                        return operation(token.tokens[1:-1])
-                    if token._get_repr_name() == 'Integer':
-                        return token.value, None
-                    if is_function(token):
-                        return sql_function(token)
-                    elif token.is_group():
-                        return col_identifier(token)
-
-                ids = map(get_id, ids)
-                cols = [(x if y is None else (x+'_'+y)).replace('.', '_')
-                        for x, y in ids]
-                for _id, col in zip(ids, cols):
-                    try:
-                        # only add non-numbers to column identifiers dict
-                        float(col)
-                    except:
-                        identifiers[col] = _id
-                expr = reduce(lambda x, (y, z): x+' '+y+' '+z,
-                              zip(operators, cols[1:]), cols[0])
+                expr = expression(tkns, identifiers)
 
                 # give auto-genereted name if no alias specified
                 if as_name is None:
-                    as_name = ''.join(cols)
+                    as_name = re.sub(r'[\s()+\-*/%<>=!&|~]', '', expr)
                 op = {'as_name': as_name,
                       'expr': (expr, identifiers)}
 
@@ -205,56 +314,21 @@ class SQLParser(object):
 
                 return as_name, None
 
-            def comparison(comps, operators=None):
+            def comparison(tkns):
+                """compile a condition into a string for numexpr along with
+                the identifiers it references"""
                 # identifiers used in comparision, needed to work around issue #83
                 identifiers = {}
-
-                # need a counter for number of comparisons for variable names
-                def comp_str(comp):
-                    comp_map = {
-                        '=': '==',
-                        '<>': '!=',
-                    }
-                    comp = strip_tkns(comp)
-                    assert len(comp) == 3
-                    col, comp, val = comp
-                    comp = comp_map.get(comp.value, comp.value)
-                    if is_function(col):
-                        col, fn = sql_function(col)
-                        col_str = (col+'_'+fn).replace('.', '_')
-                        identifiers[col_str] = col, fn
-                    elif col.is_group():
-                        col = col_identifier(col)[0]
-                        col_str = col.replace('.', '_')
-                        identifiers[col_str] = col, None
-                    if val.is_group():
-                        val = col_identifier(val)[0]
-                        identifiers[val.replace('.', '_')] = val, None
-                    else:
-                        val = val.value
-                    val_str = val.replace('.', '_')
-                    return """({col} {comp} {val})""".format(col=col_str,
-                                                             comp=comp,
-                                                             val=val_str)
-
-                comp = comps[0]
-                ev_str = comp_str(comp)
-                if operators is not None:
-                    for comp, op in zip(comps[1:], operators):
-                        # build string to eventually evaluate
-                        if op == 'AND':
-                            ev_str += " & " + comp_str(comp)
-                        elif op == 'OR':
-                            ev_str += " | " + comp_str(comp)
-
-                return ev_str, identifiers
+                return expression(tkns, identifiers), identifiers
 
             def parse_case(tkns, as_name=None):
-                def get_stmt(token):
-                    if is_function(token):
-                        return sql_function(token)
+                def get_stmt(tkns):
+                    if len(tkns) > 1:
+                        return operation(tkns)
+                    if is_function(tkns[0]):
+                        return sql_function(tkns[0])
                     else:
-                        return col_identifier(token)
+                        return col_identifier(tkns[0])
 
                 # give auto-genereted name if no alias specified
                 if as_name is None:
@@ -262,25 +336,27 @@ class SQLParser(object):
                     as_name = 'case' + str(self.case_num)
                 case = {'as_name': as_name,
                         'stmts': []}
-                # remove whitespace from tokens
-                tkns = strip_tkns(tkns)
-                # need to parse backwards for proper order of operations
-                for i, token in reversed(list(enumerate(tkns))):
-                    # stop at CASE as we are looping in reverse so will
-                    # be starting at END
-                    if token.ttype == tokens.Keyword.CASE:
-                        break
-                    elif tkns[i-1].value == 'ELSE':
-                        case['else_stmt'] = get_stmt(token)
-                    elif tkns[i-1].value == 'THEN':
-                        stmt = get_stmt(token)
-                    elif is_comparison(token):
-                        if token.is_group():
-                            cond = comparison([token.tokens])
-                        else:
-                            cond = comparison([[tkns[i-1], token,
-                                                tkns[i+1]]])
-                        case['stmts'].append((cond, stmt))
+                # split tokens into the clauses between CASE, WHEN, THEN, ELSE
+                # and END keywords
+                clause, part = None, []
+                for token in strip_tkns(tkns) + [None]:
+                    keyword = None
+                    if token is not None and token.ttype in tokens.Keyword:
+                        keyword = token.value.upper()
+                    if token is not None and keyword not in \
+                            ('CASE', 'WHEN', 'THEN', 'ELSE', 'END'):
+                        part.append(token)
+                        continue
+                    if clause == 'WHEN':
+                        cond = comparison(part)
+                    elif clause == 'THEN':
+                        case['stmts'].append((cond, get_stmt(part)))
+                    elif clause == 'ELSE':
+                        case['else_stmt'] = get_stmt(part)
+                    clause, part = keyword, []
+                # statements are applied in reverse so the first matching
+                # WHEN takes precedence
+                case['stmts'].reverse()
 
                 _cases = cases.get(curr_sect, [])
                 _cases.append(case)
@@ -290,6 +366,16 @@ class SQLParser(object):
             def parse_select(tkns):
                 identifiers = []
                 tkns = strip_tkns(tkns)
+                items = [t for t in tkns[1:] if t.ttype not in tokens.Keyword]
+                if len(items) > 1 and any(
+                        t.ttype in tokens.Name.Placeholder
+                        for item in items for t in item.flatten()):
+                    # sqlparse split the select list around a ?, so what
+                    # follows it would be dropped
+                    raise ValueError(
+                        'Unsupported ? in the select list, write it as the '
+                        'right operand of an aliased expression such as '
+                        't.a + ? AS x, or use the antlr parser')
                 for i, token in enumerate(tkns):
                     if token.ttype is tokens.Wildcard:
                         return
@@ -332,6 +418,9 @@ class SQLParser(object):
                 return table, identifier
 
             def parse_join(tkns, how):
+                # the joins following this one are parsed first, but are put
+                # after it so joins are applied in the order written
+                position = len(joins)
                 for i, token in enumerate(tkns):
                     if 'JOIN' in token.value:
                         how_new = token.value.split()[0].lower()
@@ -349,14 +438,26 @@ class SQLParser(object):
                         right_on = col_identifier(token.tokens[-1])[0]
                     elif token.is_group():
                         right, right_identifier = tbl_identifier(token.tokens)
-                joins.append((right, how, left_on, right_on, right_identifier))
+                joins.insert(position,
+                             (right, how, left_on, right_on, right_identifier))
 
             def parse_where(tkns):
-                # list of boolean indices to apply to current value
-                comps = [token.tokens for token in tkns if is_comparison(token)]
-                operators = [token.value for token in tkns
-                             if token.value in ('AND', 'OR')]
-                return comparison(comps, operators)
+                # drop the WHERE keyword
+                tkns = strip_tkns(tkns)[1:]
+                keywords = [token.value.upper() for token in tkns
+                            if token.ttype in tokens.Keyword]
+                if 'OR' not in keywords:
+                    # each part of a chain of ANDs can be applied on its own,
+                    # which lets the planner push them below joins
+                    part = []
+                    for token in tkns + [None]:
+                        if token is None or (token.ttype in tokens.Keyword and
+                                             token.value.upper() == 'AND'):
+                            conjuncts.append(comparison(part))
+                            part = []
+                        else:
+                            part.append(token)
+                return comparison(tkns)
 
             def parse_group(tkns):
                 for tkn in tkns:
@@ -412,7 +513,20 @@ class SQLParser(object):
             _parsed['NESTED_QUERIES'] = nested_queries
             _parsed['OPS'] = ops
             _parsed['LITERALS'] = literals
+            _parsed['CONJUNCTS'] = conjuncts
             return _parsed
 
-        tkns = parse(statement)[0].tokens
-        return parse_tkns(tkns)
+        # names of the parameters bound to the statement, including those of
+        # its nested queries
+        self.params = set()
+        stmt = parse(statement)[0]
+        # bare ?s are numbered in the order they are written, while sections
+        # aren't necessarily parsed in that order or only once
+        self.positions = dict(
+            (id(tkn), i) for i, tkn in
+            enumerate(tkn for tkn in stmt.flatten() if tkn.value == '?'
+                      and tkn.ttype in tokens.Name.Placeholder))
+        tkns = stmt.tokens
+        _parsed = parse_tkns(tkns)
+        _parsed['PARAMS'] = sorted(self.params)
+        return _parsed
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+
+class QueryStats(object):
+    """statistics recorded while executing a statement, available as
+    PandasCursor.last_stats once the statement has run"""
+    def __init__(self):
+        # one dictionary per join describing how it was carried out
+        self.joins = []
+        # totals for each stage of the statement that ran, keyed on the stage
+        # in the order they first ran. a stage runs more than once for every
+        # join, chunk, partition or set of parameters
+        self.stages = OrderedDict()
+        # statistics of each nested query, keyed on the temporary table its
+        # result is read from. they are included in those of the statement
+        self.nested = OrderedDict()
+
+    def record(self, stage, seconds, rows_in, rows_out, size):
+        """add a run of stage taking seconds, from rows_in rows to rows_out,
+        and growing the memory held by the intermediate result by size bytes
+        to the totals of the stage"""
+        totals = self.stages.get(stage)
+        if totals is None:
+            totals = self.stages[stage] = {'calls': 0, 'seconds': 0.0,
+                                           'rows_in': 0, 'rows_out': 0,
+                                           'bytes': 0}
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        totals['rows_in'] += rows_in
+        totals['rows_out'] += rows_out
+        totals['bytes'] += size
+
+    def merge(self, other):
+        """add the statistics of a part of the statement executed apart, such
+        as a nested query or a partition run in a worker process"""
+        self.joins.extend(other.joins)
+        for stage, totals in other.stages.iteritems():
+            self.record(stage, totals['seconds'], totals['rows_in'],
+                        totals['rows_out'], totals['bytes'])
+            self.stages[stage]['calls'] += totals['calls'] - 1
+
+    @property
+    def seconds(self):
+        """time taken by every stage"""
+        return sum(totals['seconds'] for totals in self.stages.itervalues())
+
+    def to_dict(self):
+        return {'stages': [dict(totals, stage=stage)
+                           for stage, totals in self.stages.iteritems()],
+                'joins': list(self.joins), 'seconds': self.seconds}
+
+    def __repr__(self):
+        return 'QueryStats(%s)' % ', '.join(
+            '%s=%.6fs' % (stage, totals['seconds'])
+            for stage, totals in self.stages.iteritems())
@@ -0,0 +1,32 @@
+from collections import namedtuple
+
+# typed syntax tree of a SELECT statement as built by ANTLRParser. columns is
+# a list of ResultColumn, or None for SELECT *, table the Table in FROM,
+# joins a list of Join in the order they are written, where an expression
+# or None, group_by a list of expressions and order_by a list of Ordering
+Select = namedtuple('Select', ['columns', 'table', 'joins', 'where',
+                               'group_by', 'order_by'])
+ResultColumn = namedtuple('ResultColumn', ['expr', 'alias'])
+# query is the Select of a nested query, None for a table in the database
+Table = namedtuple('Table', ['name', 'alias', 'query'])
+# how is one of join, inner or left and on the expression joined on
+Join = namedtuple('Join', ['how', 'table', 'on'])
+Ordering = namedtuple('Ordering', ['expr', 'descending'])
+
+# expressions, table is None for a column name that isn't qualified and
+# text is a literal as written in SQL
+Column = namedtuple('Column', ['table', 'name'])
+Literal = namedtuple('Literal', ['text'])
+# a bound parameter, name is what it is compiled to for numexpr
+Parameter = namedtuple('Parameter', ['name'])
+Function = namedtuple('Function', ['name', 'args'])
+UnaryOp = namedtuple('UnaryOp', ['op', 'operand'])
+BinaryOp = namedtuple('BinaryOp', ['op', 'left', 'right'])
+# whens is a list of (condition, result) pairs, operand is the expression
+# following CASE if any and default the ELSE result or None
+Case = namedtuple('Case', ['operand', 'whens', 'default'])
+
+# operators grouped by how they are compiled for numexpr
+ARITHMETIC = frozenset(['+', '-', '*', '/', '%', '&', '|', '<<', '>>'])
+COMPARISONS = frozenset(['<', '<=', '>', '>=', '=', '==', '!=', '<>'])
+BOOLEAN = frozenset(['AND', 'OR'])
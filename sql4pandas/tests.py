@@ -93,6 +93,26 @@ if __name__ == "__main__":
                GROUP BY tbl1.a, tbl2.b
                """)
     print crs.fetchall()
+    # a column grouped on and aggregated as well
+    crs.execute("""SELECT tbl1.f, tbl1.a, SUM(tbl1.a), MEAN(tbl1.b)
+                   FROM tbl1
+                   WHERE tbl1.a > 100
+                   GROUP BY tbl1.f, tbl1.a""")
+    print crs.fetchall()
+    # an OR inside a conjunct binds looser than the AND around it. the antlr
+    # parser needs antlr4, which isn't installed with sql4pandas
+    parsers = ['sqlparse']
+    try:
+        import antlr4
+        parsers.append('antlr')
+    except ImportError:
+        pass
+    for parser in parsers:
+        either = PandasCursor(db, parser=parser)
+        either.execute("""SELECT tbl1.a, tbl1.c FROM tbl1
+                          WHERE (tbl1.a > 0 OR tbl1.b > 0) AND tbl1.c < 0""")
+        print parser, len(either.fetchall()) == \
+            (((tbl1.a > 0) | (tbl1.b > 0)) & (tbl1.c < 0)).sum()
 
     def test():
         crs.execute("""SELECT e FROM tbl1""")
@@ -101,7 +121,7 @@ if __name__ == "__main__":
                        FROM tbl1
                             INNER JOIN tbl2
                                 ON tbl2.a = tbl1.a
-                        WHERE tbl2.a > 7""", 'test', 7)
+                        WHERE tbl2.a > ?""", 7)
         print crs.fetchall()
         crs.execute("""SELECT
                     CASE
@@ -137,14 +157,5 @@ if __name__ == "__main__":
                    """)
         return crs.fetchall()
 
-    testing = False
-    if testing:
-        tests = 100
-        from timeit import Timer
-        t = Timer(test)
-        print '***me'
-        print t.timeit(number=tests)
-        print 'result'
-        print test()
-    else:
-        print test()
+    # timings are in benchmarks/bench_executor.py
+    print test()